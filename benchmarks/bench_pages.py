@@ -0,0 +1,156 @@
+"""Sivujen mittaus ilman Supabasea: synteettinen historia + prosessin sisäinen asiakas.
+
+Mittaa eri historian pituuksilla:
+- fetch: täysi synkronointi paikalliseen tallenteeseen ja tyhjä delta-haku
+- transform: trendien valmistelu, trendianalytiikka, kuukausikoosteet ja statuslaskenta
+- render: Board View- ja Ylläpito-sivun ajo Streamlitin AppTestillä
+  (kylmä = välimuisti tyhjä, lämmin = välimuistissa)
+
+sekä jokaisen vaiheen huippumuistin (tracemalloc, erillinen ajo).
+
+Ajo: python benchmarks/bench_pages.py [--years 1 3 10] [--budget-ms 5000]
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# Mittaus käyttää omaa väliaikaista tallennetta, ei data/snapshots.sqlite:a
+os.environ["KPI_STORE_PATH"] = str(Path(tempfile.mkdtemp()) / "bench.sqlite")
+
+import pandas as pd  # noqa: E402
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+# Ilman ajonaikaa Streamlit varoittaa jokaisesta välimuisti- ja kontekstikutsusta
+logging.disable(logging.WARNING)
+
+import kpi_data  # noqa: E402
+from fake_supabase import FakeSupabase  # noqa: E402
+from kpi_analytics import trend_analytics  # noqa: E402
+from kpi_rollups import rollup  # noqa: E402
+from kpi_status import compute_status  # noqa: E402
+from kpi_transform import normalize_snapshots, prepare_trends  # noqa: E402
+from synthetic import make_history  # noqa: E402
+
+ADMIN_PIN = "bench"
+
+
+def reset(client: FakeSupabase):
+    kpi_data.clear_cache()
+    Path(os.environ["KPI_STORE_PATH"]).unlink(missing_ok=True)
+    client.requests = client.bytes_sent = 0
+
+
+def run_page(page: str) -> AppTest:
+    at = AppTest.from_file(str(ROOT / "dashboard.py"), default_timeout=300)
+    at.switch_page(page)
+    at.secrets["ADMIN_PIN"] = ADMIN_PIN
+    at.run()
+    if page.endswith("1_Yllapito.py"):
+        at.text_input[0].input(ADMIN_PIN).run()
+    if at.exception:
+        raise RuntimeError(f"{page}: {at.exception[0].value}")
+    return at
+
+
+def measure(fn, setup=None):
+    # (sekunnit, huippumuisti tavuina); muisti mitataan erillisellä ajolla,
+    # jottei tracemallocin hidastus näy ajoissa
+    if setup:
+        setup()
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+
+    if setup:
+        setup()
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return elapsed, peak
+
+
+def bench_size(years: float, latency: float) -> list[dict]:
+    rows = json.loads(make_history(years=years).to_json(orient="records"))
+    client = FakeSupabase({kpi_data.TABLE: rows}, latency=latency)
+    kpi_data.create_client = lambda url, key, **kwargs: client
+    kpi_data.reset_client()
+
+    results = []
+
+    def record(stage, seconds, peak, **extra):
+        results.append({"years": years, "rows": len(rows), "stage": stage,
+                        "ms": seconds * 1000, "peak_mb": peak / 2**20, **extra})
+
+    # --- fetch ---
+    seconds, peak = measure(kpi_data.sync_store, setup=lambda: reset(client))
+    record("fetch (täysi)", seconds, peak, requests=client.requests, kb=client.bytes_sent / 1024)
+
+    def zero_counters():
+        client.requests = client.bytes_sent = 0
+
+    seconds, peak = measure(kpi_data.sync_store, setup=zero_counters)
+    record("fetch (delta)", seconds, peak, requests=client.requests, kb=client.bytes_sent / 1024)
+
+    # --- transform ---
+    raw = pd.DataFrame(rows)
+    record("transform: normalisointi", *measure(lambda: normalize_snapshots(raw)))
+    history = kpi_data.read_local_history()
+    latest = kpi_data.latest_per_metric(history)
+    record("transform: trendit", *measure(lambda: prepare_trends(history)))
+    record("transform: trendianalytiikka", *measure(lambda: trend_analytics(history)))
+    record("transform: kuukausikoosteet", *measure(lambda: rollup(history, "month")))
+    record("transform: status (historia)", *measure(lambda: compute_status(history)))
+    record("transform: status (viimeisin)", *measure(lambda: compute_status(latest)))
+
+    # --- render ---
+    for page in ("pages/2_Board_View.py", "pages/1_Yllapito.py"):
+        name = Path(page).stem
+        record(f"render {name} (kylmä)", *measure(lambda: run_page(page), setup=lambda: reset(client)))
+        record(f"render {name} (lämmin)", *measure(lambda: run_page(page)))
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--years", type=float, nargs="+", default=[1, 3, 10],
+                        help="historian pituudet vuosina (päivittäiset snapshotit)")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="simuloitu viive per pyyntö sekunteina")
+    parser.add_argument("--budget-ms", type=float, default=None,
+                        help="virhe, jos Board Viewn lämmin ajo ylittää rajan")
+    args = parser.parse_args()
+
+    results = []
+    for years in args.years:
+        results += bench_size(years, args.latency)
+
+    print(f"{'vuodet':>6} {'rivit':>8}  {'vaihe':<34} {'ms':>9} {'muisti MB':>10}  lisätiedot")
+    for r in results:
+        extra = ""
+        if "requests" in r:
+            extra = f"{r['requests']} pyyntöä, {r['kb']:.0f} kB"
+        print(f"{r['years']:>6g} {r['rows']:>8}  {r['stage']:<34} {r['ms']:>9.1f} {r['peak_mb']:>10.1f}  {extra}")
+
+    if args.budget_ms is not None:
+        over = [r for r in results if r["stage"] == "render 2_Board_View (lämmin)" and r["ms"] > args.budget_ms]
+        if over:
+            print(f"\nBoard View ylitti {args.budget_ms:.0f} ms budjetin: "
+                  + ", ".join(f"{r['years']:g} v = {r['ms']:.0f} ms" for r in over))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
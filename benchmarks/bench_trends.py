@@ -0,0 +1,56 @@
+"""Trendien valmistelun mittaus: vanha per-mittari-silmukka vs. prepare_trends.
+
+Ajo: python benchmarks/bench_trends.py [rivimäärä]
+"""
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from kpi_transform import clean_number, prepare_trends  # noqa: E402
+from synthetic import make_rows  # noqa: E402
+
+
+def legacy_trends(data: pd.DataFrame) -> dict[str, pd.DataFrame]:
+    out = {}
+    for metric_name in data["metric"].unique():
+        df = data[data["metric"] == metric_name].copy()
+        df["date_clean"] = pd.to_datetime(df["date"], errors="coerce")
+        df["value_clean"] = df["value"].apply(clean_number)
+        df = df.dropna(subset=["date_clean", "value_clean"]).copy()
+        df = df.sort_values("date_clean")
+        df = df.drop_duplicates(subset=["date_clean"], keep="last")
+        out[metric_name] = df
+    return out
+
+
+def timed(fn, *args, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 110_000
+    data = make_rows(n_rows)
+
+    new = prepare_trends(data)
+    old = legacy_trends(data)
+    for metric, series in new.items():
+        assert np.allclose(series["value"].to_numpy(), old[metric]["value_clean"].to_numpy())
+
+    t_old = timed(legacy_trends, data)
+    t_new = timed(prepare_trends, data)
+    print(f"rivejä {n_rows}: vanha {t_old * 1000:.1f} ms, uusi {t_new * 1000:.1f} ms "
+          f"({t_old / t_new:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+"""Prosessin sisäinen Supabase-korvike mittauksia varten.
+
+Toteuttaa sen osan supabase-py:n rajapinnasta, jota sivut käyttävät
+(table().select()/insert()/upsert() + suodattimet, order, range, execute)
+sekä organisaatiokohtaisen viimeisin-näkymän ja datan versiotaulun
+(sql/005_kpi_org_season.sql).
+Vastaukset kulkevat JSONin kautta kuten oikeassa asiakkaassa, ja palvelimen
+rivikatto (oletus 1000) on voimassa.
+"""
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+LATEST_VIEW = "kpi_snapshots_latest"
+VERSION_TABLE = "kpi_data_version"
+
+OPS = {
+    "eq": lambda a, b: a == b,
+    "gt": lambda a, b: a > b,
+    "gte": lambda a, b: a >= b,
+    "lt": lambda a, b: a < b,
+    "lte": lambda a, b: a <= b,
+    "in": lambda a, b: a in b,
+}
+
+
+def _test(row: dict, column: str, op: str, value) -> bool:
+    a = row.get(column)
+    if a is None:
+        return False
+    if isinstance(value, str):
+        a = str(a)
+    return OPS[op](a, value)
+
+
+def _sort_key(value):
+    # Numerot numeroina, muut merkkijonoina (päivämäärät ovat ISO-muodossa)
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return (0, value, "")
+    return (1, 0, str(value))
+
+
+def _latest_view(rows: list[dict]) -> list[dict]:
+    latest = {}
+    for row in sorted(rows, key=lambda r: (str(r["date"]), r.get("id", 0))):
+        latest[row.get("org_id"), row["metric"]] = row
+    return list(latest.values())
+
+
+class FakeQuery:
+    def __init__(self, client, table: str):
+        self.client = client
+        self.table = table
+        self.action = "select"
+        self.payload = None
+        self.count = None
+        self.filters = []
+        self.orders = []
+        self.window = None
+        self.row_limit = None
+
+    # --- Kyselyn rakentaminen ---
+    def select(self, columns: str = "*", count=None):
+        self.count = count
+        return self
+
+    def insert(self, rows, **kwargs):
+        self.action, self.payload = "insert", rows
+        return self
+
+    def upsert(self, rows, on_conflict: str = "", **kwargs):
+        self.action, self.payload = "upsert", rows
+        self.on_conflict = [c.strip() for c in on_conflict.split(",") if c.strip()]
+        return self
+
+    def _filter(self, column, op, value):
+        self.filters.append((column, op, value))
+        return self
+
+    def eq(self, column, value):
+        return self._filter(column, "eq", value)
+
+    def gt(self, column, value):
+        return self._filter(column, "gt", value)
+
+    def gte(self, column, value):
+        return self._filter(column, "gte", value)
+
+    def lt(self, column, value):
+        return self._filter(column, "lt", value)
+
+    def lte(self, column, value):
+        return self._filter(column, "lte", value)
+
+    def in_(self, column, values):
+        return self._filter(column, "in", tuple(values))
+
+    def or_(self, filters: str):
+        # PostgRESTin or-suodatin: 'date.gte."2024-01-01",id.gt.5'
+        conditions = []
+        for part in filters.split(","):
+            column, op, value = part.split(".", 2)
+            if value.startswith('"'):
+                value = value.strip('"')
+            else:
+                try:
+                    value = float(value)
+                except ValueError:
+                    pass
+            conditions.append((column, op, value))
+        self.filters.append(("or", tuple(conditions), None))
+        return self
+
+    def order(self, column, desc: bool = False):
+        self.orders.append((column, desc))
+        return self
+
+    def range(self, start: int, end: int):
+        self.window = (start, end)
+        return self
+
+    def limit(self, n: int):
+        self.row_limit = n
+        return self
+
+    # --- Suoritus ---
+    def _matches(self, row: dict) -> bool:
+        for column, op, value in self.filters:
+            if column == "or":
+                if not any(_test(row, *condition) for condition in op):
+                    return False
+            elif not _test(row, column, op, value):
+                return False
+        return True
+
+    def _write(self) -> list[dict]:
+        rows = self.payload if isinstance(self.payload, list) else [self.payload]
+        table = self.client.tables.setdefault(self.table, [])
+        rows = json.loads(json.dumps(rows))
+        existing = {}
+        if self.action == "upsert" and self.on_conflict:
+            # Ristiriitainen rivi päivitetään ja säilyttää id:nsä kuten Postgresissa
+            keys = {tuple(row.get(c) for c in self.on_conflict) for row in rows}
+            kept = []
+            for r in table:
+                key = tuple(r.get(c) for c in self.on_conflict)
+                if key in keys:
+                    existing[key] = r["id"]
+                else:
+                    kept.append(r)
+            table[:] = kept
+        for row in rows:
+            key = tuple(row.get(c) for c in self.on_conflict) if existing else None
+            if key in existing:
+                row["id"] = existing[key]
+            else:
+                self.client.next_id += 1
+                row.setdefault("id", self.client.next_id)
+            table.append(row)
+        return rows
+
+    def _select(self) -> list[dict]:
+        # Suodatettu ja järjestetty tulos pidetään muistissa taulun versioon
+        # asti, jotta sivutettu haku ei järjestä koko taulua joka sivulla
+        client = self.client
+        key = (self.table, tuple(self.filters), tuple(self.orders), client.version)
+        if key in client.result_cache:
+            return client.result_cache[key]
+
+        if self.table == LATEST_VIEW:
+            rows = _latest_view(client.tables.get("kpi_snapshots", []))
+        elif self.table == VERSION_TABLE:
+            rows = [{"org_id": org, "version": v} for org, v in client.org_versions.items()]
+        else:
+            rows = client.tables.get(self.table, [])
+        rows = [r for r in rows if self._matches(r)]
+        for column, desc in reversed(self.orders):
+            rows = sorted(rows, key=lambda r: _sort_key(r.get(column)), reverse=desc)
+
+        client.result_cache = {key: rows}
+        return rows
+
+    def execute(self):
+        client = self.client
+        if client.latency:
+            time.sleep(client.latency)
+        if client.fail_with is not None:
+            raise client.fail_with
+
+        with client.lock:
+            client.requests += 1
+            if self.action != "select":
+                client.version += 1
+                data = self._write()
+                # Datan versio kasvaa vain snapshot-kirjoituksista ja vain
+                # kirjoitettujen rivien organisaatioille (trigger)
+                if self.table == "kpi_snapshots":
+                    client.data_version += 1
+                    for org in {row.get("org_id") for row in data}:
+                        client.org_versions[org] = client.org_versions.get(org, 0) + 1
+                return SimpleNamespace(data=data, count=None)
+            rows = self._select()
+
+        total = len(rows)
+        if self.window is not None:
+            rows = rows[self.window[0]:self.window[1] + 1]
+        if self.row_limit is not None:
+            rows = rows[:self.row_limit]
+        rows = rows[:client.max_rows]
+
+        # JSON-kierros kuten oikeassa HTTP-vastauksessa
+        body = json.dumps(rows)
+        with client.lock:
+            client.bytes_sent += len(body)
+        return SimpleNamespace(data=json.loads(body), count=total if self.count else None)
+
+
+class FakeSupabase:
+    def __init__(self, tables: dict | None = None, max_rows: int = 1000, latency: float = 0.0):
+        self.tables = {name: list(rows) for name, rows in (tables or {}).items()}
+        self.max_rows = max_rows
+        self.latency = latency
+        self.fail_with = None
+        self.next_id = max((r.get("id", 0) for rows in self.tables.values() for r in rows), default=0)
+        self.requests = 0
+        self.bytes_sent = 0
+        self.version = 0
+        self.data_version = 0
+        self.org_versions = {}
+        self.result_cache = {}
+        self.lock = threading.Lock()
+
+    def table(self, name: str) -> FakeQuery:
+        return FakeQuery(self, name)
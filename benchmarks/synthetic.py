@@ -0,0 +1,58 @@
+"""Synteettinen kpi_snapshots-historia mittauksia varten."""
+import numpy as np
+import pandas as pd
+
+from metrics_definitions import ALL_METRICS, METRICS
+
+# Karkeat lähtötasot yksiköittäin (arvo, tavoite, varoitusraja)
+BASELINES = {
+    "eur": (120000.0, 100000.0, 60000.0),
+    "pct": (80.0, 85.0, 70.0),
+    "score": (4.1, 4.3, 4.0),
+    "decimal": (2.0, 2.0, 1.5),
+    "number": (400.0, 420.0, 350.0),
+}
+
+
+def _noisy(values: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    # Käsin syötetyn näköisiä merkkijonoja: "1 234,5" ja välilyöntejä
+    out = values.astype(object)
+    out[mask] = [f"{v:,.1f}".replace(",", " ").replace(".", ",") for v in values[mask]]
+    return out
+
+
+def make_history(years: float = 10, freq: str = "D", noise: float = 0.1,
+                 seed: int = 0, start: str = "2015-01-01", org_id: str = "default") -> pd.DataFrame:
+    """Kaikki mittarit jokaisena snapshot-päivänä, arvot satunnaiskävelynä.
+
+    Palauttaa Supabasen rivien muotoisen DataFramen (date ISO-merkkijonona).
+    """
+    rng = np.random.default_rng(seed)
+    metrics = [m for metric_list in ALL_METRICS.values() for m in metric_list]
+    end = pd.Timestamp(start) + pd.Timedelta(days=max(round(years * 365), 1))
+    dates = pd.date_range(start, end, freq=freq, inclusive="left")
+    n_dates, n_metrics = len(dates), len(metrics)
+
+    base = np.array([BASELINES[METRICS[m]["unit"]] for m in metrics])
+    steps = rng.normal(0, 0.01, size=(n_dates, n_metrics)).cumsum(axis=0)
+    values = (base[:, 0] * (1 + steps)).round(1).ravel()
+    targets = np.tile(base[:, 1], n_dates)
+    warnings = np.tile(base[:, 2], n_dates)
+
+    return pd.DataFrame({
+        "org_id": org_id,
+        "id": np.arange(1, n_dates * n_metrics + 1),
+        "date": np.repeat(dates.strftime("%Y-%m-%dT%H:%M:%S"), n_metrics),
+        "metric": np.tile(metrics, n_dates),
+        "value": _noisy(values, rng.random(values.size) < noise),
+        "target": targets,
+        "warning": warnings,
+        "direction": np.tile([METRICS[m]["direction"] for m in metrics], n_dates),
+    })
+
+
+def make_rows(n_rows: int, seed: int = 0) -> pd.DataFrame:
+    # Tarkka rivimäärä päivittäisestä historiasta
+    n_metrics = sum(len(v) for v in ALL_METRICS.values())
+    years = -(-n_rows // n_metrics) / 365
+    return make_history(years=years, seed=seed).head(n_rows)
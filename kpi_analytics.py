@@ -0,0 +1,106 @@
+import numpy as np
+import pandas as pd
+
+from kpi_transform import is_normalized, normalize_snapshots
+from metrics_definitions import metric_meta
+
+# Trendianalytiikka kaikille mittareille yhdellä läpikäynnillä. Normalisoitu
+# kehys on järjestetty (metric, date), joten mittarit ovat yhtenäisiä lohkoja:
+# lohkokohtaiset summat saadaan np.add.reduceat-kutsuilla ilman groupby-silmukkaa,
+# ja pienimmän neliösumman kulmakerroin lasketaan suoraan summista.
+
+# Liukuva keskiarvo ja kulmakerroin lasketaan viimeisten päivien riveistä
+WINDOW_DAYS = 90
+DAYS_PER_MONTH = 365.25 / 12
+# Kauempana olevaa varoitusrajan ylitystä ei ennusteta
+HORIZON_DAYS = 365
+# Muutos/kk alle tämän osuuden historian keskihajonnasta -> tasainen
+FLAT_RATIO = 0.1
+# Vakioarvoisella mittarilla keskihajonta on 0; pyöristyksestä jäävä kulmakerroin
+# alle tämän osuuden tasosta tulkitaan myös tasaiseksi
+FLAT_EPS = 1e-9
+
+ANALYTICS_COLUMNS = ["date", "mean", "slope", "zscore", "trend", "improving", "crossing"]
+
+
+def trend_analytics(data: pd.DataFrame, window_days: int = WINDOW_DAYS,
+                    horizon_days: int = HORIZON_DAYS, org: str | None = None) -> pd.DataFrame:
+    # Yksi rivi per mittari (indeksinä mittarin nimi):
+    # date = viimeisin rivi, mean = liukuva keskiarvo, slope = muutos/kk,
+    # zscore = viimeisin arvo suhteessa koko historiaan, trend = up/down/flat,
+    # improving = muutos mittarin hyvään suuntaan, crossing = arvioitu päivä,
+    # jolloin nykyvauhdilla ohitetaan varoitusraja (NaT, jos ei horisontissa)
+    if not is_normalized(data):
+        data = normalize_snapshots(data)
+    # Puuttuvat arvot pudotetaan taulukoista; rows kertoo rivien paikat kehyksessä
+    values = data["value"].to_numpy(dtype="float64")
+    rows = np.flatnonzero(~np.isnan(values))
+    if len(rows) == 0:
+        return pd.DataFrame(columns=ANALYTICS_COLUMNS, index=pd.Index([], name="metric"))
+
+    metric = data.index.get_level_values("metric")
+    codes = np.asarray(metric.codes if hasattr(metric, "codes") else pd.factorize(metric)[0])[rows]
+    starts = np.flatnonzero(np.concatenate([[True], codes[1:] != codes[:-1]]))
+    sizes = np.diff(np.append(starts, len(codes)))
+    ends = starts + sizes - 1
+    block = np.repeat(np.arange(len(starts)), sizes)
+    last_rows = rows[ends]
+
+    dates = data.index.get_level_values("date")
+    y = values[rows]
+    # x: päivinä suhteessa mittarin viimeisimpään riviin (<= 0), jolloin
+    # summat pysyvät pieninä ja viimeisin arvo on sovitteen kohdassa x = 0
+    days = dates.as_unit("s").asi8[rows] / 86400.0
+    x = days - days[ends][block]
+
+    # --- Koko historia: z-score ---
+    mean_all = np.add.reduceat(y, starts) / sizes
+    var_all = np.add.reduceat((y - mean_all[block]) ** 2, starts) / np.maximum(sizes - 1, 1)
+    std_all = np.sqrt(var_all)
+    latest = y[ends]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        zscore = np.where(std_all > 0, (latest - mean_all) / std_all, np.nan)
+
+    # --- Ikkuna: liukuva keskiarvo ja kulmakerroin ---
+    in_window = (x >= -window_days).astype("float64")
+    xw, yw = x * in_window, y * in_window
+    n = np.add.reduceat(in_window, starts)
+    sx, sy = np.add.reduceat(xw, starts), np.add.reduceat(yw, starts)
+    sxy, sxx = np.add.reduceat(xw * y, starts), np.add.reduceat(xw * x, starts)
+    denom = n * sxx - sx ** 2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slope_per_day = np.where(denom > 1e-9, (n * sxy - sx * sy) / denom, np.nan)
+    mean = sy / n
+    slope = slope_per_day * DAYS_PER_MONTH
+
+    # --- Suunta ja varoitusrajan ylitys ---
+    names = np.asarray(metric[last_rows].astype(str))
+    direction = data["direction"].iloc[last_rows].astype(object).to_numpy()
+    meta = metric_meta(org)
+    default_direction = np.array([meta.get(m, {}).get("direction", "up") for m in names], dtype=object)
+    direction = np.where(pd.isna(direction), default_direction, direction)
+    sign = np.where(direction == "down", -1.0, 1.0)
+
+    flat = ~(np.abs(slope) > np.maximum(FLAT_RATIO * std_all, FLAT_EPS * np.abs(mean_all)))
+    trend = np.where(flat, "flat", np.where(slope > 0, "up", "down"))
+
+    warning = data["warning"].to_numpy(dtype="float64")[last_rows]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        days_to_warning = (warning - latest) / slope_per_day
+    crosses = ~flat & np.isfinite(days_to_warning) & (days_to_warning > 0) & (days_to_warning <= horizon_days)
+    last_date = dates[last_rows]
+    crossing = pd.DatetimeIndex(np.where(
+        crosses,
+        last_date.as_unit("s").asi8 + (np.where(crosses, days_to_warning, 0) * 86400).astype("int64"),
+        np.iinfo("int64").min,
+    ).astype("datetime64[s]"))
+
+    return pd.DataFrame({
+        "date": last_date,
+        "mean": mean,
+        "slope": slope,
+        "zscore": zscore,
+        "trend": trend,
+        "improving": ~flat & (slope * sign > 0),
+        "crossing": crossing,
+    }, index=pd.Index(names, name="metric"))
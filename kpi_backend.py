@@ -0,0 +1,96 @@
+from typing import Iterable, Iterator, Protocol
+
+import pandas as pd
+
+import kpi_rollups
+import kpi_store
+
+# Snapshot-datan tallennusrajapinta. kpi_data lukee ja kirjoittaa dataa vain
+# näiden metodien kautta; välimuistit, single-flight ja Board-dokumentti
+# rakennetaan niiden päälle. Toteutukset:
+# - LocalBackend: paikallinen SQLite-tiedosto (KPI_BACKEND=sqlite), ei verkkoa
+# - kpi_data.SupabaseBackend: Supabase + paikallinen kopio samasta tiedostosta
+# Kaikki kutsut koskevat yhtä organisaatiota (org), ja rivit palautetaan
+# kpi_snapshots-muodossa (normalisoimattomina).
+
+
+class SnapshotBackend(Protocol):
+    def version(self, org: str) -> str:
+        # Muuttuu jokaisessa organisaation kirjoituksessa; välimuistit avataan tällä
+        ...
+
+    def history(self, org: str, start=None, end=None) -> pd.DataFrame:
+        # Rivit järjestyksessä (metric, date); start/end ISO-päivinä, mukaan lukien
+        ...
+
+    def latest(self, org: str) -> pd.DataFrame | None:
+        # Viimeisin rivi per mittari, tai None, jos lähde ei tue suoraa hakua
+        ...
+
+    def rollups(self, org: str, grain: str, start=None) -> pd.DataFrame:
+        # Kuukausi- tai neljännesvuosikoosteet (kpi_rollups.GRAINS) järjestyksessä (metric, period)
+        ...
+
+    def insert(self, org: str, rows: list[dict], snapshot_key: str | None = None) -> list[dict]:
+        # Tallennetut rivit; koosteet päivittyvät samalla
+        ...
+
+    def bulk_insert(self, org: str, chunks: Iterable[list[dict]]) -> Iterator[list[dict]]:
+        # Tallennetut rivit palakohtaisesti, sitä mukaa kuin palat valmistuvat
+        ...
+
+    def read_payload(self, org: str) -> dict | None:
+        # {"data_version", "payload"} tai None
+        ...
+
+    def write_payload(self, org: str, version: str, payload: dict):
+        ...
+
+
+class LocalBackend:
+    # Koko data paikallisessa SQLite-tiedostossa, (org_id, metric, date)
+    # -pääavaimella ja (org_id, date) -indeksillä: historia, aikarajaukset ja
+    # viimeisimmät rivit ovat indeksoituja hakuja. Jokainen kirjoitus päivittää
+    # kirjoitettujen rivien kuukausi- ja neljännesvuosikoosteet. Board-dokumenttia
+    # ei tallenneta, vaan se lasketaan versiokohtaiseen välimuistiin.
+    def __init__(self, path=None):
+        self.path = path
+
+    def version(self, org: str) -> str:
+        with kpi_store.connect(self.path) as conn:
+            return kpi_store.data_version(conn, org)
+
+    def history(self, org: str, start=None, end=None) -> pd.DataFrame:
+        with kpi_store.connect(self.path) as conn:
+            return kpi_store.read_history(conn, org, start, end)
+
+    def latest(self, org: str) -> pd.DataFrame | None:
+        with kpi_store.connect(self.path) as conn:
+            return kpi_store.read_latest(conn, org)
+
+    def rollups(self, org: str, grain: str, start=None) -> pd.DataFrame:
+        with kpi_store.connect(self.path) as conn:
+            kpi_rollups.ensure(conn, org)
+            return kpi_store.read_rollups(conn, org, grain, start)
+
+    def insert(self, org: str, rows: list[dict], snapshot_key: str | None = None) -> list[dict]:
+        # Sama (org_id, metric, date) korvaa aiemman rivin, joten uudelleenyritys ei luo tuplia
+        with kpi_store.connect(self.path) as conn:
+            kpi_store.append(conn, rows, org)
+            kpi_rollups.refresh_rows(conn, org, rows)
+        return rows
+
+    def bulk_insert(self, org: str, chunks: Iterable[list[dict]]) -> Iterator[list[dict]]:
+        # SQLite sallii yhden kirjoittajan kerrallaan -> palat peräkkäin,
+        # kukin omana transaktionaan
+        with kpi_store.connect(self.path) as conn:
+            for chunk in chunks:
+                kpi_store.append(conn, chunk, org)
+                kpi_rollups.refresh_rows(conn, org, chunk)
+                yield chunk
+
+    def read_payload(self, org: str) -> dict | None:
+        return None
+
+    def write_payload(self, org: str, version: str, payload: dict):
+        pass
@@ -0,0 +1,290 @@
+import html
+from datetime import datetime
+from string import Template
+
+from kpi_analytics import WINDOW_DAYS
+from kpi_status import UNKNOWN
+from kpi_transform import clean_number
+from metrics_definitions import CASH_DETAIL_METRICS, format_change, format_value
+
+# Board Viewn ja tulostettavan board packin yhteinen tyyli
+BOARD_CSS = """
+:root{
+  --bg: #0b0b0b;
+  --text: #f2f2f2;
+  --muted: #b7b7b7;
+  --gold: #caa64a;
+  --gold2:#e1c36b;
+  --border: rgba(202,166,74,0.22);
+}
+
+[data-testid="stSidebar"] { display: none; }
+[data-testid="stSidebarNav"] { display: none; }
+section.main > div { padding-left: 1rem !important; }
+
+.stApp{
+  background: radial-gradient(1200px 800px at 15% 10%, #161616 0%, var(--bg) 55%, #070707 100%);
+  color: var(--text);
+}
+
+h1 { font-size: 1.55rem !important; letter-spacing: .3px; }
+h2 { font-size: 1.20rem !important; margin-top: .25rem !important; }
+h3 { font-size: 1.05rem !important; }
+p, li, span, div { font-size: 0.95rem; }
+.block-container { padding-top: 1rem; padding-bottom: 1rem; }
+hr { border-color: rgba(255,255,255,0.08) !important; }
+
+.kpi-category{
+  margin: 0.25rem 0 0.35rem 0;
+  padding: .35rem .65rem;
+  border-left: 4px solid var(--gold);
+  background: linear-gradient(90deg, rgba(202,166,74,0.12), rgba(202,166,74,0.02));
+  border-radius: 10px;
+  font-weight: 750;
+  letter-spacing: .4px;
+}
+
+.kpi-card{
+  background: linear-gradient(180deg, rgba(255,255,255,0.04), rgba(255,255,255,0.02));
+  border: 1px solid var(--border);
+  border-radius: 16px;
+  padding: .65rem .75rem .55rem .75rem;
+  box-shadow: 0 10px 24px rgba(0,0,0,0.30);
+  margin-bottom: .75rem;
+  overflow: hidden;
+}
+
+.kpi-title{
+  display:flex;
+  align-items:flex-start;
+  justify-content:space-between;
+  gap:.6rem;
+  margin-bottom:.20rem;
+}
+
+.kpi-name{
+  font-weight: 780;
+  letter-spacing:.2px;
+  color: var(--text);
+  font-size: 0.95rem;
+  line-height: 1.15rem;
+  flex: 1 1 auto;
+  min-width: 0;
+  white-space: normal;
+  overflow-wrap: anywhere;
+  word-break: break-word;
+}
+
+.kpi-status{
+  font-size: 1.15rem;
+  filter: drop-shadow(0 1px 1px rgba(0,0,0,0.35));
+  flex: 0 0 auto;
+  margin-top: 0.02rem;
+}
+
+.kpi-value{
+  font-size: 1.25rem;
+  font-weight: 900;
+  color: var(--gold2);
+  line-height: 1.35rem;
+  margin: .10rem 0 .25rem 0;
+}
+
+.kpi-meta{
+  color: var(--muted);
+  font-size: 0.82rem;
+  margin-bottom: .25rem;
+}
+
+.kpi-trend{
+  font-size: 0.80rem;
+  margin-bottom: .25rem;
+}
+.kpi-trend.good{ color: #7bc67e; }
+.kpi-trend.bad{ color: #e57373; }
+.kpi-trend.flat{ color: var(--muted); }
+
+.forecast-title{
+  color: var(--gold2);
+  font-size: 0.88rem;
+  font-weight: 800;
+  margin: .25rem 0 .35rem 0;
+}
+
+.kpi-grid{
+  display: grid;
+  grid-template-columns: repeat(4, minmax(0, 1fr));
+  column-gap: .75rem;
+  align-items: start;
+}
+
+.risk-grid{
+  display: grid;
+  grid-template-columns: 1fr 1fr 3fr;
+  gap: .75rem;
+}
+
+@media (max-width: 1000px){
+  .kpi-grid{ grid-template-columns: repeat(2, minmax(0, 1fr)); }
+}
+
+@media (max-width: 640px){
+  .kpi-grid, .risk-grid{ grid-template-columns: minmax(0, 1fr); }
+}
+
+.risk-box{
+  background: rgba(255,255,255,0.03);
+  border: 1px solid rgba(255,255,255,0.08);
+  border-radius: 14px;
+  padding: .65rem .75rem;
+}
+
+.kpi-spark{
+  display: block;
+  margin-top: .15rem;
+}
+
+.kpi-forecast{
+  display: block;
+  margin-top: .35rem;
+}
+
+.js-plotly-plot, .plot-container { background: transparent !important; }
+
+button[kind="secondary"]{
+  padding: .15rem .45rem !important;
+  min-height: 2rem !important;
+  border-radius: 10px !important;
+  border: 1px solid rgba(202,166,74,0.35) !important;
+  background: rgba(202,166,74,0.10) !important;
+  color: #f2f2f2 !important;
+}
+
+button[kind="secondary"] *{
+  font-size: 1.05rem !important;
+  font-weight: 900 !important;
+}
+"""
+
+# Koko kategorian kortit rakennetaan yhdeksi HTML-elementiksi (CSS grid
+# st.columns(4):n sijaan), jolloin jokainen kategoria on yksi viesti selaimelle.
+# Pohjat ovat yksirivisiä, jotta Markdown ei tulkitse sisennettyä HTML:ää koodiksi.
+
+CARD = Template(
+    '<div class="kpi-card">'
+    '<div class="kpi-title"><div class="kpi-name">$name</div><div class="kpi-status">$status</div></div>'
+    '<div class="kpi-value">$value</div>'
+    '<div class="kpi-meta">$meta</div>'
+    '$trend'
+    '$extra'
+    '</div>'
+)
+
+# Trendirivi: nuoli (väri kertoo, onko muutos mittarin hyvään suuntaan) ja
+# arvio nykyvauhdin jatkumisesta; tarkemmat luvut vihjetekstissä
+TREND = Template('<div class="kpi-trend $tone" title="$title">$arrow $text</div>')
+TREND_ARROWS = {"up": "↗", "down": "↘", "flat": "→"}
+
+CASH_PANEL = Template(
+    '<div class="kpi-card" style="margin-top:-0.35rem;">'
+    '<div class="forecast-title">Kassaennuste </div>'
+    '<div class="kpi-meta"><strong>Viimeisin toteuma:</strong> $latest</div>'
+    '<div class="kpi-meta"><strong>Keskimääräinen kk-muutos:</strong> $change</div>'
+    '<div class="kpi-meta"><strong>Volatiliteetti:</strong> $volatility</div>'
+    '<div class="kpi-meta" style="margin-top:0.35rem;"><strong>6 kk ennuste</strong></div>'
+    '<div class="kpi-meta">Varovainen: $cautious</div>'
+    '<div class="kpi-meta">Perus: $base</div>'
+    '<div class="kpi-meta">Optimistinen: $optimistic</div>'
+    '$band'
+    '</div>'
+)
+
+RISK_BOX = Template(
+    '<div class="risk-box">'
+    '<div style="font-weight:800;">$title</div>'
+    '<div style="$style">$body</div>'
+    '</div>'
+)
+
+COUNT_STYLE = "font-size:1.4rem; font-weight:900; color: var(--gold2);"
+
+
+def trend_line(metric_name: str, trend: dict | None, org: str | None = None) -> str:
+    # trend: analytics_rows-rivi (slope, trend, improving, zscore, mean, crossing) tai None
+    if not trend or trend["slope"] is None:
+        return ""
+    zscore = "—" if trend["zscore"] is None else f"{trend['zscore']:+.1f}"
+    title = (f"Liukuva keskiarvo {WINDOW_DAYS} pv: {format_value(metric_name, trend['mean'], org)} · "
+             f"z-score historiaan: {zscore}")
+    if trend["trend"] == "flat":
+        tone, text = "flat", f"Tasainen viimeiset {WINDOW_DAYS} pv"
+    else:
+        tone = "good" if trend["improving"] else "bad"
+        text = f"Tällä vauhdilla {format_change(metric_name, trend['slope'], org)} / kk"
+        if trend["crossing"]:
+            text += f" · varoitusraja n. {datetime.fromisoformat(trend['crossing']):%m/%Y}"
+    return TREND.substitute(tone=tone, title=html.escape(title), arrow=TREND_ARROWS[trend["trend"]],
+                            text=html.escape(text))
+
+
+def metric_card(metric_name: str, row, extra: str = "", trend: dict | None = None, org: str | None = None) -> str:
+    # row: viimeisin rivi (value, target, warning, status) tai None
+    name = html.escape(metric_name)
+    if row is None:
+        return CARD.substitute(name=name, status=UNKNOWN, value="—",
+                               meta="Ei vielä tallennettua dataa", trend="", extra="")
+    if row["status"] == UNKNOWN:
+        return CARD.substitute(name=name, status=UNKNOWN, value="—",
+                               meta="Arvoa ei voitu tulkita numeeriseksi", trend="", extra="")
+
+    target = format_value(metric_name, clean_number(row["target"]), org)
+    warning = format_value(metric_name, clean_number(row["warning"]), org)
+    return CARD.substitute(
+        name=name,
+        status=row["status"],
+        value=format_value(metric_name, clean_number(row["value"]), org),
+        meta=f"Tavoite: {target} &nbsp;|&nbsp; Varoitus: {warning}",
+        trend=trend_line(metric_name, trend, org),
+        extra=extra,
+    )
+
+
+def cash_panel(latest_by_metric: dict, band: str = "", org: str | None = None) -> str:
+    # band: valmis ennustehaarukan SVG (kpi_charts.forecast_svg) tai tyhjä
+    def detail(name):
+        row = latest_by_metric.get(name)
+        if row is None:
+            return "—"
+        return format_value(name, clean_number(row["value"]), org)
+
+    latest, change, volatility, cautious, base, optimistic = (detail(m) for m in CASH_DETAIL_METRICS)
+    return CASH_PANEL.substitute(latest=latest, change=change, volatility=volatility,
+                                 cautious=cautious, base=base, optimistic=optimistic, band=band)
+
+
+def category_grid(category: str, metric_names: list[str], latest_by_metric: dict,
+                  sparks: dict[str, str] | None = None, analytics: dict | None = None,
+                  forecast: str = "", org: str | None = None) -> str:
+    cells = []
+    for metric_name in metric_names:
+        row = latest_by_metric.get(metric_name)
+        cell = metric_card(metric_name, row, (sparks or {}).get(metric_name, ""),
+                           (analytics or {}).get(metric_name), org)
+        if metric_name == "Kassatilanne + ennuste" and row is not None and row["status"] != UNKNOWN:
+            cell += cash_panel(latest_by_metric, forecast, org)
+        cells.append(f"<div>{cell}</div>")
+
+    return (
+        f'<div class="kpi-category">{html.escape(category)}</div>'
+        f'<div class="kpi-grid">{"".join(cells)}</div>'
+    )
+
+
+def risk_summary(n_critical: int, n_warning: int, note: str) -> str:
+    return (
+        '<div class="risk-grid">'
+        + RISK_BOX.substitute(title="🔴 Kriittiset", style=COUNT_STYLE, body=n_critical)
+        + RISK_BOX.substitute(title="🟡 Varoitukset", style=COUNT_STYLE, body=n_warning)
+        + RISK_BOX.substitute(title="Huomio", style="color: var(--muted);", body=html.escape(note))
+        + "</div>"
+    )
@@ -0,0 +1,207 @@
+import html
+import math
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+
+# Plotlyn oletusväri, jotta kaikki kuvaajatilat näyttävät samalta
+LINE_COLOR = "#636efa"
+SPARK_COLOR = "#e1c36b"
+
+CHART_MODES = {
+    "card": "Kortin alla",
+    "category": "Kategoriakuvaaja",
+    "svg": "Kevyt (SVG)",
+}
+
+
+# --- Harvennus: Largest-Triangle-Three-Buckets ---
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    # Valitsee n_out pistettä niin, että käyrän muoto säilyy: ensimmäinen ja
+    # viimeinen piste pidetään, välissä jokaisesta lohkosta piste, joka
+    # muodostaa suurimman kolmion edellisen valinnan ja seuraavan lohkon
+    # keskiarvon kanssa.
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    x = x.astype("float64")
+    y = y.astype("float64")
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+
+    out = np.empty(n_out, dtype=np.int64)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_start, next_end = edges[i + 1], edges[i + 2]
+        else:
+            next_start, next_end = n - 1, n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        area = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(area.argmax())
+        out[i + 1] = a
+    return out
+
+
+def downsample(trend: pd.DataFrame, max_points: int) -> pd.DataFrame:
+    # trend: DataFrame[date, value] aikajärjestyksessä
+    if len(trend) <= max_points:
+        return trend
+    x = trend["date"].to_numpy().astype("datetime64[ns]").astype(np.int64)
+    idx = lttb_indices(x, trend["value"].to_numpy(), max_points)
+    return trend.iloc[idx]
+
+
+# --- Plotly ---
+def _style(fig: go.Figure, height: int) -> go.Figure:
+    fig.update_layout(
+        height=height,
+        margin=dict(l=0, r=0, t=0, b=0),
+        paper_bgcolor="rgba(0,0,0,0)",
+        plot_bgcolor="rgba(0,0,0,0)",
+        font=dict(color="#f2f2f2"),
+        showlegend=False,
+    )
+    fig.update_xaxes(showgrid=False, zeroline=False, title=None)
+    fig.update_yaxes(showgrid=True, gridcolor="rgba(255,255,255,0.06)", zeroline=False, title=None)
+    return fig
+
+
+def _range_traces(trend: pd.DataFrame) -> list[go.Scatter]:
+    # Koosteiden jaksokohtainen vaihteluväli (min–max) varjostettuna
+    if "min" not in trend or "max" not in trend:
+        return []
+    return [
+        go.Scatter(x=trend["date"], y=trend["max"], mode="lines", line=dict(width=0), hoverinfo="skip"),
+        go.Scatter(x=trend["date"], y=trend["min"], mode="lines", line=dict(width=0),
+                   fill="tonexty", fillcolor="rgba(99,110,250,0.18)", hoverinfo="skip"),
+    ]
+
+
+def card_figure(trend: pd.DataFrame, max_points: int) -> go.Figure:
+    trend = downsample(trend, max_points)
+    fig = go.Figure(_range_traces(trend))
+    fig.add_trace(go.Scatter(x=trend["date"], y=trend["value"], mode="lines",
+                             line=dict(color=LINE_COLOR, width=2)))
+    return _style(fig, 140)
+
+
+def category_figure(trends: dict[str, pd.DataFrame], metric_names: list[str],
+                    max_points: int, cols: int = 4) -> go.Figure | None:
+    # Kaikki kategorian trendit yhtenä kuvana (yksi Plotly-payload per kategoria)
+    names = [m for m in metric_names if m in trends and len(trends[m]) > 1]
+    if not names:
+        return None
+
+    rows = math.ceil(len(names) / cols)
+    fig = make_subplots(
+        rows=rows,
+        cols=cols,
+        subplot_titles=names,
+        vertical_spacing=0.35 / rows,
+        horizontal_spacing=0.04,
+    )
+    for i, name in enumerate(names):
+        trend = downsample(trends[name], max_points)
+        for trace in _range_traces(trend):
+            fig.add_trace(trace, row=i // cols + 1, col=i % cols + 1)
+        fig.add_trace(
+            go.Scatter(x=trend["date"], y=trend["value"], mode="lines",
+                       line=dict(color=LINE_COLOR, width=2), name=name),
+            row=i // cols + 1,
+            col=i % cols + 1,
+        )
+    fig = _style(fig, 170 * rows)
+    fig.update_layout(margin=dict(l=0, r=0, t=24, b=0))
+    fig.update_annotations(font_size=12)
+    return fig
+
+
+def forecast_figure(balances: pd.Series, band: pd.DataFrame) -> go.Figure:
+    # Kuukausisaldot ja ennustehaarukka (p10–p90 varjostettuna, p50 katkoviivana)
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=band["date"], y=band["p90"], mode="lines",
+                             line=dict(width=0), hoverinfo="skip"))
+    fig.add_trace(go.Scatter(x=band["date"], y=band["p10"], mode="lines", line=dict(width=0),
+                             fill="tonexty", fillcolor="rgba(225,195,107,0.25)", hoverinfo="skip"))
+    fig.add_trace(go.Scatter(x=band["date"], y=band["p50"], mode="lines",
+                             line=dict(color=SPARK_COLOR, width=2, dash="dash"), name="Perus"))
+    fig.add_trace(go.Scatter(x=balances.index, y=balances.to_numpy(), mode="lines",
+                             line=dict(color=LINE_COLOR, width=2), name="Toteuma"))
+    return _style(fig, 200)
+
+
+# --- Kevyt SVG-sparkline ---
+def sparkline_svg(trend: pd.DataFrame, max_points: int, width: int = 240, height: int = 44) -> str:
+    if trend is None or len(trend) < 2:
+        return ""
+    trend = downsample(trend, max_points)
+    x = trend["date"].to_numpy().astype("datetime64[ns]").astype(np.int64).astype("float64")
+    y = trend["value"].to_numpy(dtype="float64")
+
+    pad = 2
+    x_span = (x.max() - x.min()) or 1.0
+    y_span = (y.max() - y.min()) or 1.0
+    px_x = pad + (x - x.min()) / x_span * (width - 2 * pad)
+    px_y = height - pad - (y - y.min()) / y_span * (height - 2 * pad)
+    points = " ".join(f"{a:.1f},{b:.1f}" for a, b in zip(px_x, px_y))
+
+    title = html.escape(f"{trend['date'].iloc[0]:%d.%m.%Y} – {trend['date'].iloc[-1]:%d.%m.%Y}")
+    return (
+        f'<svg class="kpi-spark" viewBox="0 0 {width} {height}" preserveAspectRatio="none" '
+        f'width="100%" height="{height}"><title>{title}</title>'
+        f'<polyline fill="none" stroke="{SPARK_COLOR}" stroke-width="1.6" '
+        f'stroke-linejoin="round" points="{points}"/></svg>'
+    )
+
+
+def forecast_svg(balances: pd.Series, band: pd.DataFrame, months: int = 24,
+                 width: int = 720, height: int = 180) -> str:
+    # Staattinen versio forecast_figure-kuvaajasta (esim. board pack): viimeiset
+    # kuukausisaldot, p10–p90-haarukka varjostettuna ja p50 katkoviivana
+    balances = balances.iloc[-months:]
+    if balances.empty:
+        return ""
+
+    def to_x(dates):
+        return pd.DatetimeIndex(dates).to_numpy().astype("datetime64[ns]").astype(np.int64).astype("float64")
+
+    bx, by = to_x(balances.index), balances.to_numpy(dtype="float64")
+    fx = to_x(band["date"])
+    all_x = np.concatenate([bx, fx])
+    all_y = np.concatenate([by, band["p10"].to_numpy(dtype="float64"), band["p90"].to_numpy(dtype="float64")])
+
+    pad = 4
+    x_span = (all_x.max() - all_x.min()) or 1.0
+    y_span = (all_y.max() - all_y.min()) or 1.0
+
+    def points(x, y):
+        px_x = pad + (x - all_x.min()) / x_span * (width - 2 * pad)
+        px_y = height - pad - (y - all_y.min()) / y_span * (height - 2 * pad)
+        return " ".join(f"{a:.1f},{b:.1f}" for a, b in zip(px_x, px_y))
+
+    # Haarukka ja perusura alkavat viimeisestä toteumasta
+    start_x, start_y = bx[-1:], by[-1:]
+    upper = points(np.concatenate([start_x, fx]), np.concatenate([start_y, band["p90"].to_numpy(dtype="float64")]))
+    lower = points(np.concatenate([start_x, fx])[::-1],
+                   np.concatenate([start_y, band["p10"].to_numpy(dtype="float64")])[::-1])
+    base = points(np.concatenate([start_x, fx]), np.concatenate([start_y, band["p50"].to_numpy(dtype="float64")]))
+
+    title = html.escape(f"{balances.index[0]:%m/%Y} – {band['date'].iloc[-1]:%m/%Y}")
+    return (
+        f'<svg class="kpi-forecast" viewBox="0 0 {width} {height}" preserveAspectRatio="none" '
+        f'width="100%" height="{height}"><title>{title}</title>'
+        f'<polygon fill="rgba(225,195,107,0.25)" stroke="none" points="{upper} {lower}"/>'
+        f'<polyline fill="none" stroke="{SPARK_COLOR}" stroke-width="2" stroke-dasharray="6 4" points="{base}"/>'
+        f'<polyline fill="none" stroke="{LINE_COLOR}" stroke-width="2" stroke-linejoin="round" '
+        f'points="{points(bx, by)}"/></svg>'
+    )
@@ -0,0 +1,712 @@
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import httpx
+import pandas as pd
+import streamlit as st
+from supabase import ClientOptions, PostgrestAPIError, create_client
+
+import kpi_rollups
+import kpi_store
+from kpi_analytics import trend_analytics
+from kpi_backend import LocalBackend, SnapshotBackend
+from kpi_forecast import balances_from_trends, cash_forecast
+from kpi_payload import build_payload
+from kpi_rollups import GRAINS
+from kpi_timing import cache_call, cache_miss, span
+from kpi_transform import normalize_snapshots, parse_dates, prepare_trends, season_labels
+from metrics_definitions import ORG_ID_PATTERN, org_metrics
+
+TABLE = "kpi_snapshots"
+# Rivi per organisaatio, jonka versio kasvaa jokaisessa sen kirjoituksessa
+# (ks. sql/002_kpi_data_version.sql ja sql/005_kpi_org_season.sql)
+VERSION_TABLE = "kpi_data_version"
+# Board Viewn valmiiksi laskettu sisältö per organisaatio (ks. sql/004_kpi_board_payload.sql)
+PAYLOAD_TABLE = "kpi_board_payload"
+# Näkymä, joka palauttaa viimeisimmän rivin per organisaatio ja mittari (ks. sql/005_kpi_org_season.sql)
+LATEST_VIEW = "kpi_snapshots_latest"
+
+# PostgRESTin/Postgresin virhekoodit, kun sarake tai ON CONFLICT -indeksi puuttuu
+MISSING_SCHEMA_CODES = ("PGRST204", "42703", "42P10")
+
+# Verkkovirheet, joiden aikana näytetään paikallisen tallenteen data
+OFFLINE_ERRORS = (httpx.HTTPError, OSError)
+
+
+def get_setting(name: str, default=None):
+    # Ensisijaisesti Streamlitin secrets, sitten ympäristömuuttuja (CLI / Actions)
+    try:
+        return st.secrets[name]
+    except Exception:
+        return os.environ.get(name, default)
+
+
+# Kuinka kauan haettu snapshot-data pidetään välimuistissa (sekunteina).
+# Välimuisti on avattu datan versiolla, joten TTL on vain varaverkko.
+CACHE_TTL_SECONDS = int(get_setting("KPI_CACHE_TTL", 6 * 3600))
+# Kuinka usein datan versio tarkistetaan; uusi snapshot näkyy viimeistään tämän jälkeen
+VERSION_TTL_SECONDS = int(get_setting("KPI_VERSION_TTL", 5))
+# Paikallisen SQLite-tallenteen polku (oletus data/snapshots.sqlite)
+STORE_PATH = get_setting("KPI_STORE_PATH")
+# Datan lähde: "supabase" (oletus, paikallinen tallenne on kopio) tai "sqlite"
+# (paikallinen tallenne on ainoa lähde, ei verkkoyhteyttä)
+BACKEND = get_setting("KPI_BACKEND", "supabase")
+# Organisaatio, jonka data näytetään, kun sitä ei ole valittu (?org=...), sekä
+# kaikki samaa asennusta käyttävät organisaatiot pilkuilla eroteltuina
+DEFAULT_ORG = get_setting("KPI_ORG", kpi_store.LEGACY_ORG)
+ORGS = [o.strip() for o in str(get_setting("KPI_ORGS", DEFAULT_ORG)).split(",") if o.strip()]
+# Kauden ensimmäinen kuukausi (1 = kalenterivuosi, esim. 7 = heinäkuusta kesäkuuhun)
+SEASON_START_MONTH = int(get_setting("KPI_SEASON_START", 1))
+# Supabasen (PostgREST) oletusraja on 1000 riviä per vastaus
+PAGE_SIZE = int(get_setting("KPI_PAGE_SIZE", 1000))
+FETCH_WORKERS = int(get_setting("KPI_FETCH_WORKERS", 4))
+# Yksittäisen pyynnön aikaraja ja ohimenevien verkkovirheiden uusintayritykset
+HTTP_TIMEOUT_SECONDS = float(get_setting("KPI_HTTP_TIMEOUT", 10))
+RETRY_ATTEMPTS = int(get_setting("KPI_RETRY_ATTEMPTS", 3))
+# Trendikuvaajien pistebudjetti: pitkät sarjat harvennetaan (LTTB), jotta
+# kuvaajien koko ei kasva historian mukana
+TREND_POINTS = int(get_setting("KPI_TREND_POINTS", 120))
+# Massatuonnin rivejä per pyyntö
+IMPORT_CHUNK_SIZE = int(get_setting("KPI_IMPORT_CHUNK", 1000))
+RETRY_BACKOFF_SECONDS = 0.3
+RETRY_MAX_DELAY_SECONDS = 2.0
+
+# Välimuistin vanhettua edellinen tulos näytetään heti ja uusi haetaan taustalla
+# (stale-while-revalidate). Tallennus tyhjentää välimuistin, jolloin seuraava
+# lataus odottaa tuoreen datan. Välimuistit on avattu (organisaatio, versio)
+# -pareilla, joten jokaiselle organisaatiolle varataan omat paikkansa.
+CACHE_ENTRIES = int(get_setting("KPI_CACHE_ENTRIES", 4 * len(ORGS)))
+CACHE_OPTIONS = dict(ttl=CACHE_TTL_SECONDS, show_spinner=False, refresh_mode="background",
+                     max_entries=CACHE_ENTRIES)
+
+
+def current_org() -> str | None:
+    # Sivun organisaatio: ?org=-parametri, sitten istunnon aiempi valinta, sitten
+    # oletus. Tuntematon tunniste -> None, jolloin sivu ei näytä mitään dataa.
+    org = st.query_params.get("org") or st.session_state.get("org") or DEFAULT_ORG
+    if not ORG_ID_PATTERN.fullmatch(org) or org not in ORGS:
+        return None
+    st.session_state["org"] = org
+    if len(ORGS) > 1:
+        # Valinta näkyy osoitteessa, joten linkin voi jakaa
+        st.query_params["org"] = org
+    return org
+
+
+def _org(org: str | None) -> str:
+    return org or DEFAULT_ORG
+
+
+# --- Supabase-asiakas ---
+@st.cache_resource(show_spinner=False)
+def _shared_client():
+    # Yksi asiakas koko prosessille: kaikki istunnot ja hakusäikeet jakavat
+    # saman HTTP-yhteyspoolin, joten TLS-kättely tehdään vain kerran ja
+    # yhteydet pysyvät auki pyyntöjen välillä.
+    with span("supabase.create_client"):
+        http = httpx.Client(
+            timeout=httpx.Timeout(HTTP_TIMEOUT_SECONDS, connect=min(HTTP_TIMEOUT_SECONDS, 3.0)),
+            limits=httpx.Limits(
+                max_connections=FETCH_WORKERS * 4,
+                max_keepalive_connections=FETCH_WORKERS * 2,
+                keepalive_expiry=120,
+            ),
+        )
+        return create_client(
+            get_setting("SUPABASE_URL"),
+            get_setting("SUPABASE_KEY"),
+            options=ClientOptions(httpx_client=http),
+        )
+
+
+def get_client():
+    return _shared_client()
+
+
+def reset_client():
+    _shared_client.clear()
+    _partitioned.clear()
+
+
+@st.cache_resource(ttl=CACHE_TTL_SECONDS, show_spinner=False)
+def _partitioned() -> bool:
+    # Onko org_id-sarake luotu (sql/005)? Ilman sitä tietokannassa on vain
+    # oletusorganisaation data, ja kyselyt tehdään ilman organisaatiosuodatusta.
+    try:
+        execute(get_client().table(TABLE).select("org_id").limit(1))
+    except PostgrestAPIError as e:
+        if e.code not in MISSING_SCHEMA_CODES:
+            raise
+        return False
+    return True
+
+
+def _scoped(query, org: str):
+    # Rajaa kyselyn organisaation osioon (org_id on indeksien ensimmäinen sarake)
+    if _partitioned():
+        return query.eq("org_id", org)
+    if org != DEFAULT_ORG:
+        raise ValueError(f"Organisaatio '{org}' vaatii org_id-sarakkeen (sql/005_kpi_org_season.sql)")
+    return query
+
+
+def _partition_rows(rows: list[dict]) -> list[dict]:
+    # Osioimaton taulu ei tunne org_id- ja season-sarakkeita
+    if _partitioned():
+        return rows
+    return [{k: v for k, v in row.items() if k not in ("org_id", "season")} for row in rows]
+
+
+def execute(query, idempotent: bool = True):
+    # Ohimenevät verkkovirheet (yhteys, aikaraja) yritetään uudelleen
+    # eksponentiaalisella viiveellä. Kirjoitukset uusitaan vain, jos yhteyttä
+    # ei saatu lainkaan, jottei sama rivi tallennu kahdesti.
+    for attempt in range(RETRY_ATTEMPTS):
+        try:
+            return query.execute()
+        except httpx.TransportError as e:
+            retryable = idempotent or isinstance(e, httpx.ConnectError)
+            if not retryable or attempt == RETRY_ATTEMPTS - 1:
+                raise
+            delay = min(RETRY_BACKOFF_SECONDS * 2 ** attempt, RETRY_MAX_DELAY_SECONDS)
+            time.sleep(delay * random.uniform(0.5, 1.0))
+
+
+# --- Yhteinen haku (single-flight) ---
+# Samanaikaiset istunnot, jotka tarvitsevat saman datan, odottavat yhtä käynnissä
+# olevaa hakua ja saavat sen tuloksen (tai virheen) sen sijaan, että jokainen
+# lähettäisi oman pyyntönsä. Sukupolvi kasvaa clear_cache():ssa, jottei
+# tallennuksen jälkeen alkava lataus liity ennen tallennusta alkaneeseen hakuun.
+_inflight = {}
+_inflight_lock = threading.Lock()
+_generation = 0
+
+
+def single_flight(name: str, fn):
+    with _inflight_lock:
+        key = (name, _generation)
+        call = _inflight.get(key)
+        leader = call is None
+        if leader:
+            call = _inflight[key] = {"done": threading.Event()}
+
+    if not leader:
+        with span("single_flight.wait", key=name):
+            call["done"].wait()
+        if "error" in call:
+            raise call["error"]
+        return call["result"]
+
+    try:
+        call["result"] = fn()
+        return call["result"]
+    except BaseException as e:
+        call["error"] = e
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+        call["done"].set()
+
+
+def _normalize(data: pd.DataFrame) -> pd.DataFrame:
+    with span("normalize", rows=len(data)):
+        return normalize_snapshots(data, SEASON_START_MONTH)
+
+
+def tag_rows(rows: list[dict], org: str) -> list[dict]:
+    # Tallennettaville riveille organisaatio ja kausi (päivämäärästä, ellei annettu)
+    seasons = season_labels(parse_dates([row["date"] for row in rows]), SEASON_START_MONTH)
+    return [{**row, "org_id": org, "season": row.get("season") or str(season)} for row, season in zip(rows, seasons)]
+
+
+def latest_per_metric(data: pd.DataFrame) -> pd.DataFrame:
+    # Normalisoitu kehys on järjestetty (metric, date), joten viimeinen rivi on uusin
+    return data.groupby(level="metric", observed=True, sort=False).tail(1)
+
+
+# --- Sivutettu haku ---
+def iter_pages(build_query):
+    # build_query(count=...) palauttaa uuden, järjestetyn kyselyn. Ensimmäinen
+    # sivu kertoo rivien kokonaismäärän, loput sivut haetaan rinnakkain
+    # rajatussa säiepoolissa ja annetaan eteenpäin valmistumisjärjestyksessä.
+    first = execute(build_query(count="exact").range(0, PAGE_SIZE - 1))
+    total = first.count if first.count is not None else len(first.data)
+    yield first.data, total
+
+    # Palvelimen oma raja voi olla pienempi kuin PAGE_SIZE
+    page_size = len(first.data) or PAGE_SIZE
+    if page_size >= total:
+        return
+
+    def fetch(start):
+        return execute(build_query().range(start, start + page_size - 1)).data
+
+    with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as pool:
+        futures = [pool.submit(fetch, start) for start in range(page_size, total, page_size)]
+        for future in as_completed(futures):
+            yield future.result(), total
+
+
+def snapshot_query(org: str, since=None, after_id=None):
+    client = get_client()
+
+    def build_query(count=None):
+        # Sivutus vaatii yksikäsitteisen järjestyksen
+        query = _scoped(client.table(TABLE).select("*", count=count), org).order("date").order("metric")
+        if since is not None and after_id is not None:
+            query = query.or_(f'date.gte."{since}",id.gt.{after_id}')
+        elif since is not None:
+            query = query.gte("date", since)
+        return query
+
+    return build_query
+
+
+# --- Datan versio ---
+def _probe_version(org: str) -> str:
+    client = get_client()
+    with span("fetch.version", org=org):
+        try:
+            query = client.table(VERSION_TABLE).select("version")
+            resp = execute(query.eq("org_id", org) if _partitioned() else query.eq("id", 1))
+            if resp.data:
+                return str(resp.data[0]["version"])
+        except PostgrestAPIError:
+            pass
+        # Versiotaulua ei ole vielä luotu tai organisaatiolla ei ole dataa
+        # -> rivimäärä ja uusin rivi
+        query = _scoped(client.table(TABLE).select("id,date", count="exact"), org)
+        resp = execute(query.order("id", desc=True).limit(1))
+        top = resp.data[0] if resp.data else {}
+        return f"{resp.count}:{top.get('id')}:{top.get('date')}"
+
+
+@st.cache_data(ttl=VERSION_TTL_SECONDS, show_spinner=False, max_entries=CACHE_ENTRIES)
+def _cached_version(org: str) -> str:
+    return single_flight(f"version:{org}", lambda: get_backend().version(org))
+
+
+# Epäonnistunut versiohaku muistetaan VERSION_TTL_SECONDS ajan: offline-tilassa
+# saman sivun muut lataukset siirtyvät suoraan paikalliseen kopioon eivätkä
+# odota jokainen omia uudelleenyrityksiään. {org: (hetki, virhe)}
+_offline = {}
+
+
+def data_version(org: str | None = None) -> str:
+    # Pieni pyyntö, jonka tulos muuttuu vain kun organisaation snapshot-dataa on kirjoitettu.
+    # Välimuistitetut lataukset avataan tällä, joten muuttumaton data luetaan muistista.
+    org = _org(org)
+    failed = _offline.get(org)
+    if failed and time.monotonic() - failed[0] < VERSION_TTL_SECONDS:
+        raise failed[1].with_traceback(None)
+    try:
+        version = _cached_version(org)
+    except OFFLINE_ERRORS as e:
+        _offline[org] = (time.monotonic(), e)
+        raise
+    _offline.pop(org, None)
+    return version
+
+
+# --- Paikallinen tallenne + delta-synkronointi ---
+def sync_store(org: str | None = None) -> int:
+    # Yksi synkronointi kerrallaan per tallenne ja organisaatio; muut kutsujat jakavat sen tuloksen
+    org = _org(org)
+    return single_flight(f"sync:{STORE_PATH}:{org}", lambda: _sync_store(org))
+
+
+def _sync_store(org: str) -> int:
+    # Haetaan Supabasesta vain rivit, jotka ovat uudempia kuin paikallisesti
+    # viimeisin. Sama päivämäärä haetaan uudelleen (gte), jotta samaan aikaan
+    # tallennetut rivit eivät jää väliin; (org_id, metric, date) -avain poistaa tuplat.
+    # Myös id:ltään uudemmat rivit haetaan, jolloin jälkikäteen tuotu vanhempi
+    # historia päätyy kopioon. Haku ja kopio rajataan organisaation osioon.
+    with kpi_store.connect(STORE_PATH) as conn:
+        since = kpi_store.last_synced_date(conn, org)
+        try:
+            fetched = _fetch_into(conn, org, since, kpi_store.last_synced_id(conn, org))
+        except OFFLINE_ERRORS as e:
+            kpi_store.mark_failed(conn, org, e)
+            raise
+        kpi_store.mark_synced(conn, org)
+    return fetched
+
+
+def _fetch_into(conn, org: str, since, after_id) -> int:
+    fetched, total = 0, 0
+    first = last = None
+    with span("fetch.sync", org=org, delta=since is not None) as s:
+        s["rows"] = s["bytes"] = 0
+        for rows, total in iter_pages(snapshot_query(org, since, after_id)):
+            s["bytes"] += len(json.dumps(rows, default=str))
+            fetched += kpi_store.append(conn, rows, org)
+            if rows:
+                dates = [str(row["date"]) for row in rows] + ([first, last] if first else [])
+                first, last = min(dates), max(dates)
+        s["rows"] = fetched
+    if fetched < total:
+        raise RuntimeError(f"Haettiin {fetched}/{total} riviä tietokannasta")
+    # Koosteet kerran koko haetulle välille (sivut saapuvat missä järjestyksessä
+    # tahansa); ensimmäinen täysi haku laskee ne koko historiasta
+    with span("rollups.refresh", org=org, delta=since is not None):
+        if since is None:
+            kpi_rollups.rebuild(conn, org)
+        elif first is not None:
+            kpi_rollups.refresh(conn, org, first, last)
+    return fetched
+
+
+def read_local_history(org: str | None = None) -> pd.DataFrame:
+    with kpi_store.connect(STORE_PATH) as conn, span("store.read") as s:
+        data = kpi_store.read_history(conn, _org(org))
+        s["rows"] = len(data)
+    return _normalize(data)
+
+
+def sync_status(org: str | None = None) -> dict:
+    # {"synced_at": viimeisin onnistunut synkronointi, "error": viimeisin virhe tai None}
+    with kpi_store.connect(STORE_PATH) as conn:
+        state = kpi_store.get_state(conn, _org(org))
+    return {"synced_at": state.get("synced_at"), "error": state.get("error")}
+
+
+def load_history(start=None, end=None, org: str | None = None) -> pd.DataFrame:
+    # Välimuistiton, päivillä rajattu haku (ISO-päivät, molemmat mukaan lukien)
+    org = _org(org)
+    backend = get_backend()
+    with span("backend.history", backend=BACKEND, org=org) as s:
+        data = backend.history(org, start, end)
+        s["rows"] = len(data)
+    return _normalize(data)
+
+
+@st.cache_data(**CACHE_OPTIONS)
+def _load_synced_history(org: str, version: str) -> pd.DataFrame:
+    cache_miss("history")
+    return load_history(org=org)
+
+
+def load_snapshots(org: str | None = None) -> pd.DataFrame:
+    org = _org(org)
+    cache_call("history")
+    try:
+        return _load_synced_history(org, data_version(org))
+    except OFFLINE_ERRORS:
+        # Supabase ei vastaa -> paikallinen kopio. Tulosta ei viedä välimuistiin,
+        # joten seuraava lataus yrittää synkronointia uudelleen.
+        return read_local_history(org)
+
+
+@st.cache_data(**CACHE_OPTIONS)
+def _load_synced_trends(org: str, version: str) -> dict[str, pd.DataFrame]:
+    cache_miss("trends")
+    history = _load_synced_history(org, version)
+    with span("prepare_trends", rows=len(history)):
+        return prepare_trends(history)
+
+
+def load_trends(org: str | None = None) -> dict[str, pd.DataFrame]:
+    # Valmiit trendisarjat per mittari; lasketaan kerran per datamuutos
+    org = _org(org)
+    cache_call("trends")
+    try:
+        return _load_synced_trends(org, data_version(org))
+    except OFFLINE_ERRORS:
+        return prepare_trends(read_local_history(org))
+
+
+def _fetch_latest_rows(org: str):
+    with span("fetch.latest", org=org) as s:
+        resp = execute(_scoped(get_client().table(LATEST_VIEW).select("*"), org))
+        s["rows"] = len(resp.data)
+    return resp
+
+
+@st.cache_data(**CACHE_OPTIONS)
+def _load_cash_forecast(org: str, version: str) -> tuple[pd.Series, dict | None]:
+    cache_miss("forecast")
+    balances = balances_from_trends(_load_synced_trends(org, version))
+    with span("cash_forecast", rows=len(balances)):
+        return balances, cash_forecast(balances)
+
+
+def load_cash_forecast(org: str | None = None) -> tuple[pd.Series, dict | None]:
+    # (kuukausisaldot, ennuste) tallennetusta kassahistoriasta
+    org = _org(org)
+    cache_call("forecast")
+    try:
+        return _load_cash_forecast(org, data_version(org))
+    except OFFLINE_ERRORS:
+        balances = balances_from_trends(prepare_trends(read_local_history(org)))
+        return balances, cash_forecast(balances)
+
+
+@st.cache_data(**CACHE_OPTIONS)
+def _load_analytics(org: str, version: str) -> pd.DataFrame:
+    cache_miss("analytics")
+    history = _load_synced_history(org, version)
+    with span("trend_analytics", rows=len(history)):
+        return trend_analytics(history, org=org)
+
+
+def load_analytics(org: str | None = None) -> pd.DataFrame:
+    # Trendin suunta, kulmakerroin, z-score ja varoitusrajan ylitys per mittari
+    org = _org(org)
+    cache_call("analytics")
+    try:
+        return _load_analytics(org, data_version(org))
+    except OFFLINE_ERRORS:
+        return trend_analytics(read_local_history(org), org=org)
+
+
+@st.cache_data(**CACHE_OPTIONS)
+def _load_rollups(org: str, version: str, grain: str) -> pd.DataFrame:
+    cache_miss("rollups")
+    with span("backend.rollups", backend=BACKEND, org=org, grain=grain) as s:
+        data = get_backend().rollups(org, grain)
+        s["rows"] = len(data)
+    return data
+
+
+def load_rollups(grain: str, org: str | None = None) -> pd.DataFrame:
+    # Kuukausi- tai neljännesvuosikoosteet (kpi_rollups.GRAINS) paikallisesta tallenteesta
+    org = _org(org)
+    cache_call("rollups")
+    try:
+        return _load_rollups(org, data_version(org), grain)
+    except OFFLINE_ERRORS:
+        return LocalBackend(STORE_PATH).rollups(org, grain)
+
+
+@st.cache_data(**CACHE_OPTIONS)
+def _fetch_latest(org: str, version: str) -> pd.DataFrame:
+    cache_miss("latest")
+    data = get_backend().latest(org)
+    if data is None:
+        # Ei suoraa hakua (esim. näkymää ei ole vielä luotu) -> lasketaan koko historiasta
+        data = load_snapshots(org)
+        return data if data.empty else latest_per_metric(data)
+    return _normalize(data)
+
+
+def load_latest(org: str | None = None) -> pd.DataFrame:
+    org = _org(org)
+    cache_call("latest")
+    try:
+        return _fetch_latest(org, data_version(org))
+    except OFFLINE_ERRORS:
+        data = load_snapshots(org)
+        return data if data.empty else latest_per_metric(data)
+
+
+# --- Board-dokumentti ---
+def _seasons(history: pd.DataFrame) -> list[str]:
+    return sorted(history["season"].dropna().unique().astype(str)) if not history.empty else []
+
+
+def build_board_payload(version: str, org: str | None = None) -> dict:
+    org = _org(org)
+    with span("payload.build", org=org):
+        rollups = {grain: load_rollups(grain, org) for grain in GRAINS}
+        return build_payload(version, load_latest(org), load_trends(org), load_cash_forecast(org),
+                             load_analytics(org), TREND_POINTS, org_metrics(org),
+                             _seasons(load_snapshots(org)), rollups, org)
+
+
+def _local_payload(org: str | None = None) -> dict:
+    # Offline: koko dokumentti paikallisesta kopiosta yhdellä luvulla, ilman
+    # verkkopyyntöjä (vrt. build_board_payload, jonka jokainen lataus kysyisi versiota)
+    org = _org(org)
+    with span("payload.build", org=org, offline=True):
+        history = read_local_history(org)
+        trends = prepare_trends(history)
+        balances = balances_from_trends(trends)
+        backend = LocalBackend(STORE_PATH)
+        rollups = {grain: backend.rollups(org, grain) for grain in GRAINS}
+        latest = history if history.empty else latest_per_metric(history)
+        return build_payload("offline", latest, trends, (balances, cash_forecast(balances)),
+                             trend_analytics(history, org=org), TREND_POINTS, org_metrics(org), _seasons(history),
+                             rollups, org)
+
+
+def materialize_board(org: str | None = None) -> dict:
+    # Rakennetaan dokumentti nykyisestä datasta ja tallennetaan yhdeksi riviksi
+    org = _org(org)
+    version = data_version(org)
+    payload = build_board_payload(version, org)
+    with span("payload.store", org=org):
+        get_backend().write_payload(org, version, payload)
+    _load_board_payload.clear(org, version)
+    return payload
+
+
+def _refresh_board(org: str):
+    # Kutsutaan tallennusten jälkeen. Data on jo tallessa, joten dokumentin
+    # päivityksen epäonnistuminen ei kaada tallennusta: Board View laskee
+    # sisällön itse, kunnes dokumentti on taas ajan tasalla.
+    try:
+        materialize_board(org)
+    except (PostgrestAPIError, *OFFLINE_ERRORS):
+        pass
+
+
+def _fetch_payload_row(org: str):
+    with span("fetch.payload", org=org) as s:
+        query = get_client().table(PAYLOAD_TABLE).select("data_version,payload")
+        resp = execute(query.eq("org_id", org) if _partitioned() else query.eq("id", 1))
+        s["rows"] = len(resp.data)
+    return resp.data[0] if resp.data else None
+
+
+@st.cache_data(**CACHE_OPTIONS)
+def _load_board_payload(org: str, version: str) -> dict:
+    cache_miss("payload")
+    row = get_backend().read_payload(org)
+    if row is not None and row["data_version"] == version:
+        return row["payload"]
+    # Dokumenttia ei ole tai se on vanhempi kuin data -> lasketaan tässä
+    return build_board_payload(version, org)
+
+
+def load_board_payload(org: str | None = None) -> dict:
+    org = _org(org)
+    cache_call("payload")
+    try:
+        return _load_board_payload(org, data_version(org))
+    except OFFLINE_ERRORS:
+        return {**_local_payload(org), "offline": True}
+
+
+def clear_cache(org: str | None = None):
+    # Organisaation tallennus vanhentaa vain sen version: muut välimuistit on
+    # avattu (organisaatio, versio) -parilla, joten uusi versio ohittaa vanhat
+    # tulokset eivätkä muiden organisaatioiden välimuistit tyhjene.
+    global _generation
+    with _inflight_lock:
+        _generation += 1
+    if org is not None:
+        _offline.pop(org, None)
+        _cached_version.clear(org)
+        return
+    _offline.clear()
+    _cached_version.clear()
+    _load_synced_history.clear()
+    _load_synced_trends.clear()
+    _load_cash_forecast.clear()
+    _load_analytics.clear()
+    _load_rollups.clear()
+    _fetch_latest.clear()
+    _load_board_payload.clear()
+
+
+def insert_snapshot(rows: list[dict], snapshot_key: str | None = None, org: str | None = None) -> list[dict]:
+    # snapshot_key tekee tallennuksesta idempotentin: samalla avaimella
+    # kirjoitetut rivit päivitetään, joten uudelleenyritys tai tuplaklikkaus
+    # ei lisää rivejä.
+    org = _org(org)
+    with span("insert", rows=len(rows), org=org):
+        written = get_backend().insert(org, tag_rows(rows, org), snapshot_key)
+    # Uusi snapshot -> organisaation välimuisti vanhenee heti kaikissa istunnoissa
+    clear_cache(org)
+    _refresh_board(org)
+    return written
+
+
+def bulk_insert(rows: list[dict], chunk_size: int = IMPORT_CHUNK_SIZE, on_progress=None,
+                org: str | None = None) -> int:
+    # Massatuonti paloina. Valmiit palat ovat heti paikallisessa tallenteessa:
+    # keskeytyneen tuonnin uudelleenajo ohittaa ne tuplatarkistuksessa ja
+    # jatkaa siitä, mihin jäätiin.
+    org = _org(org)
+    rows = tag_rows(rows, org) if rows else rows
+    chunks = [rows[i:i + chunk_size] for i in range(0, len(rows), chunk_size)]
+    written = 0
+    try:
+        for data in get_backend().bulk_insert(org, chunks):
+            written += len(data)
+            if on_progress:
+                on_progress(written, len(rows))
+    finally:
+        # Myös keskeytynyt tuonti on voinut kirjoittaa rivejä
+        clear_cache(org)
+    _refresh_board(org)
+    return written
+
+
+# --- Taustajärjestelmät ---
+def _write_chunk(chunk: list[dict]) -> list[dict]:
+    table = get_client().table(TABLE)
+    with span("insert.chunk", rows=len(chunk)):
+        chunk = _partition_rows(chunk)
+        try:
+            return execute(table.upsert(chunk, on_conflict="snapshot_key,metric")).data
+        except PostgrestAPIError as e:
+            # Saraketta tai uniikki-indeksiä ei ole vielä luotu (sql/003) -> tavallinen lisäys
+            if e.code not in MISSING_SCHEMA_CODES:
+                raise
+            plain = [{k: v for k, v in row.items() if k != "snapshot_key"} for row in chunk]
+            return execute(table.insert(plain), idempotent=False).data
+
+
+class SupabaseBackend(LocalBackend):
+    # Lähde on Supabase. Historia luetaan paikallisesta kopiosta delta-synkronoinnin
+    # jälkeen, ja tallennetut rivit lisätään kopioon heti.
+    def version(self, org: str) -> str:
+        return _probe_version(org)
+
+    def history(self, org: str, start=None, end=None) -> pd.DataFrame:
+        sync_store(org)
+        return super().history(org, start, end)
+
+    def rollups(self, org: str, grain: str, start=None) -> pd.DataFrame:
+        sync_store(org)
+        return super().rollups(org, grain, start)
+
+    def latest(self, org: str) -> pd.DataFrame | None:
+        try:
+            resp = single_flight(f"latest:{org}", lambda: _fetch_latest_rows(org))
+        except PostgrestAPIError:
+            return None
+        return pd.DataFrame(resp.data)
+
+    def insert(self, org: str, rows: list[dict], snapshot_key: str | None = None) -> list[dict]:
+        if snapshot_key is None:
+            query = get_client().table(TABLE).insert(_partition_rows(rows))
+            return super().insert(org, execute(query, idempotent=False).data)
+        return super().insert(org, _write_chunk([{**row, "snapshot_key": snapshot_key} for row in rows]))
+
+    def bulk_insert(self, org: str, chunks):
+        # Palat upsertataan rinnakkain snapshot_key-avaimella, joten palan uusinta on turvallinen
+        with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as pool, kpi_store.connect(self.path) as conn:
+            for data in pool.map(_write_chunk, chunks):
+                kpi_store.append(conn, data, org)
+                kpi_rollups.refresh_rows(conn, org, data)
+                yield data
+
+    def read_payload(self, org: str) -> dict | None:
+        try:
+            return single_flight(f"payload:{org}", lambda: _fetch_payload_row(org))
+        except PostgrestAPIError:
+            # Taulua ei ole vielä luotu
+            return None
+
+    def write_payload(self, org: str, version: str, payload: dict):
+        if _partitioned():
+            row, key = {"org_id": org, "data_version": version, "payload": payload}, "org_id"
+        else:
+            row, key = {"id": 1, "data_version": version, "payload": payload}, "id"
+        execute(get_client().table(PAYLOAD_TABLE).upsert(row, on_conflict=key))
+
+
+BACKENDS = {"supabase": SupabaseBackend, "sqlite": LocalBackend}
+
+
+def get_backend() -> SnapshotBackend:
+    if BACKEND not in BACKENDS:
+        raise ValueError(f"Tuntematon KPI_BACKEND '{BACKEND}' (vaihtoehdot: {', '.join(BACKENDS)})")
+    return BACKENDS[BACKEND](STORE_PATH)
@@ -0,0 +1,89 @@
+import io
+
+import numpy as np
+import pandas as pd
+
+from kpi_transform import clean_numbers
+from metrics_definitions import CASH_DETAIL_METRICS
+
+# Kassaennuste kuukausisaldoista: historiallisista kk-muutoksista arvotaan
+# (bootstrap) tuhansia 6 kk:n polkuja kerralla NumPy-taulukkona, ja haarukka
+# luetaan polkujen persentiileistä.
+HORIZON_MONTHS = 6
+SCENARIOS = 5000
+# Varovainen / perus / optimistinen
+BAND_PERCENTILES = (10, 50, 90)
+MIN_MONTHS = 3
+
+# Tallennetusta historiasta luetaan ensimmäinen mittari, jolla on dataa
+CASH_HISTORY_METRICS = ["Kassa – viimeisin toteuma", "Kassatilanne + ennuste"]
+
+
+# --- Kuukausisaldot ---
+def monthly_balances(dates, values) -> pd.Series:
+    # Kuukauden viimeinen saldo per kuukausi, aikajärjestyksessä
+    balances = pd.Series(
+        clean_numbers(pd.Series(values)).to_numpy(),
+        index=pd.to_datetime(pd.Series(dates), errors="coerce"),
+    )
+    balances = balances[balances.index.notna()].dropna().sort_index()
+    if balances.empty:
+        return balances
+    return balances.resample("ME").last().dropna()
+
+
+def read_balances(name: str, content: bytes) -> pd.Series:
+    # CSV tai Excel, jossa ensimmäinen sarake on kuukausi/päivämäärä ja
+    # toinen kassan saldo (otsikkorivi vapaa)
+    if name.lower().endswith((".xlsx", ".xls")):
+        data = pd.read_excel(io.BytesIO(content))
+    else:
+        data = pd.read_csv(io.BytesIO(content), sep=None, engine="python")
+    if data.shape[1] < 2:
+        raise ValueError("Tiedostossa pitää olla kuukausi- ja saldosarake")
+    return monthly_balances(data.iloc[:, 0], data.iloc[:, 1])
+
+
+def balances_from_trends(trends: dict[str, pd.DataFrame]) -> pd.Series:
+    for metric_name in CASH_HISTORY_METRICS:
+        trend = trends.get(metric_name)
+        if trend is not None and len(trend) > 1:
+            return monthly_balances(trend["date"], trend["value"])
+    return pd.Series(dtype="float64")
+
+
+# --- Ennuste ---
+def cash_forecast(balances: pd.Series, horizon: int = HORIZON_MONTHS,
+                  scenarios: int = SCENARIOS, seed: int = 0) -> dict | None:
+    # Palauttaa tunnusluvut ja kuukausittaisen haarukan (DataFrame[date, p10, p50, p90]),
+    # tai None, jos kuukausisaldoja on liian vähän
+    if len(balances) < MIN_MONTHS:
+        return None
+
+    values = balances.to_numpy(dtype="float64")
+    changes = np.diff(values)
+    latest = values[-1]
+
+    rng = np.random.default_rng(seed)
+    paths = latest + rng.choice(changes, size=(scenarios, horizon)).cumsum(axis=1)
+    low, mid, high = np.percentile(paths, BAND_PERCENTILES, axis=0)
+
+    months = pd.date_range(balances.index[-1], periods=horizon + 1, freq="ME")[1:]
+    band = pd.DataFrame({"date": months, "p10": low, "p50": mid, "p90": high})
+
+    return {
+        "latest": float(latest),
+        "mean_change": float(changes.mean()),
+        "volatility": float(changes.std(ddof=1)) if len(changes) > 1 else 0.0,
+        "cautious": float(low[-1]),
+        "base": float(mid[-1]),
+        "optimistic": float(high[-1]),
+        "months": len(balances),
+        "band": band,
+    }
+
+
+def detail_values(forecast: dict) -> dict[str, float]:
+    # Ennuste Kassa-erittelyn mittareiksi (samassa järjestyksessä kuin CASH_DETAIL_METRICS)
+    keys = ["latest", "mean_change", "volatility", "cautious", "base", "optimistic"]
+    return {metric_name: round(forecast[key], 2) for metric_name, key in zip(CASH_DETAIL_METRICS, keys)}
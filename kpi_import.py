@@ -0,0 +1,190 @@
+"""Historian massatuonti CSV/Excel-tiedostosta kpi_snapshots-tauluun.
+
+Ajo: python kpi_import.py data/history.csv [--org seura] [--chunk-size 1000] [--dry-run]
+(SUPABASE_URL ja SUPABASE_KEY ympäristömuuttujista)
+"""
+import argparse
+import csv
+import hashlib
+import io
+import re
+import sys
+import uuid
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from kpi_data import DEFAULT_ORG, IMPORT_CHUNK_SIZE, ORGS, bulk_insert, load_history
+from kpi_transform import clean_numbers, parse_dates
+from metrics_definitions import metric_meta, org_metrics
+
+# Tiedoston sarakkeet kpi_snapshots-taulun järjestyksessä. Otsikkorivi on
+# vapaaehtoinen; suomenkieliset otsikot tunnistetaan myös.
+COLUMNS = ["date", "metric", "value", "target", "warning", "direction"]
+HEADER_ALIASES = {
+    "date": "date", "pvm": "date", "päivämäärä": "date",
+    "metric": "metric", "mittari": "metric",
+    "value": "value", "arvo": "value",
+    "target": "target", "tavoite": "target",
+    "warning": "warning", "varoitus": "warning", "varoitusraja": "warning",
+    "direction": "direction", "suunta": "direction",
+}
+REQUIRED = ["date", "metric", "value"]
+
+# Tuonnin rivien snapshot_key johdetaan tiedoston sisällöstä ja päivästä, joten
+# saman tiedoston uudelleenajo kirjoittaa samat rivit (upsert) eikä luo tuplia.
+# Jo tallennetut (metric, date) -rivit ohitetaan, joten keskeytynyt tuonti jatkuu.
+# Muiden kuin oletusorganisaation avaimiin lisätään organisaatio, jottei sama
+# tiedosto kahteen organisaatioon tuotuna päivitä toisen rivejä.
+IMPORT_NAMESPACE = uuid.UUID("5b0e7c52-4f7e-4d5e-9a57-2f1f3c9d8a61")
+
+
+def _name_key(names: pd.Series) -> pd.Series:
+    return (
+        names.astype(str)
+        .str.strip()
+        .str.casefold()
+        .str.replace(r"[–—]", "-", regex=True)
+        .str.replace(r"\s+", " ", regex=True)
+    )
+
+
+@lru_cache(maxsize=None)
+def _metric_lookup(org_id: str | None) -> dict[str, str]:
+    # Organisaation mittariston nimet vertailuavaimella
+    names = [m for metric_list in org_metrics(org_id).values() for m in metric_list]
+    return dict(zip(_name_key(pd.Series(names)), names))
+
+
+def import_id(content: bytes, org_id: str | None = None) -> str:
+    digest = hashlib.sha256(content)
+    if org_id and org_id != DEFAULT_ORG:
+        digest.update(f"/{org_id}".encode())
+    return digest.hexdigest()[:16]
+
+
+# --- Luku ---
+def read_table(name: str, content: bytes) -> pd.DataFrame:
+    if name.lower().endswith((".xlsx", ".xls")):
+        raw = pd.read_excel(io.BytesIO(content), header=None, dtype=object)
+    else:
+        sample = content[:4096].decode("utf-8", errors="ignore")
+        sep = csv.Sniffer().sniff(sample, delimiters=",;\t").delimiter if sample.strip() else ","
+        raw = pd.read_csv(io.BytesIO(content), header=None, dtype=object, sep=sep)
+    if raw.empty:
+        return pd.DataFrame(columns=COLUMNS)
+
+    first = [HEADER_ALIASES.get(str(v).strip().casefold()) for v in raw.iloc[0]]
+    if any(first):
+        # Otsikkorivi: tunnistamattomat sarakkeet jätetään pois
+        data = raw.iloc[1:].set_axis([c or f"_{i}" for i, c in enumerate(first)], axis=1)
+        return data[[c for c in COLUMNS if c in data]].reset_index(drop=True)
+    return raw.iloc[:, :len(COLUMNS)].set_axis(COLUMNS[:raw.shape[1]], axis=1)
+
+
+# --- Validointi (yksi vektoroitu läpikäynti) ---
+def _parse_dates(values: pd.Series) -> pd.Series:
+    # ISO-päivämäärät (2024-01-31, myös aikavyöhykkeellä kuten kpi_snapshots-vienti)
+    # kerralla naiiveina UTC-aikoina kuten normalisoitu historia, loput
+    # suomalaisena muotona (31.1.2024)
+    dates = parse_dates(values)
+    rest = dates.isna() & values.notna()
+    if rest.any():
+        finnish = pd.to_datetime(values[rest].astype(str), errors="coerce", dayfirst=True, format="mixed", utc=True)
+        dates[rest] = finnish.dt.tz_localize(None)
+    return dates.astype("datetime64[ns]")
+
+
+def validate(data: pd.DataFrame, org_id: str | None = None) -> tuple[pd.DataFrame, pd.DataFrame]:
+    # Palauttaa (kelvolliset rivit kpi_snapshots-muodossa, hylätyt rivit + syy).
+    # Mittarit tunnistetaan organisaation mittaristosta.
+    missing = [c for c in REQUIRED if c not in data]
+    if missing:
+        raise ValueError(f"Tiedostosta puuttuu sarake: {', '.join(missing)}")
+
+    def column(name):
+        return data[name] if name in data else pd.Series(np.nan, index=data.index)
+
+    metric = _name_key(data["metric"]).map(_metric_lookup(org_id))
+    # Puuttuva tai tunnistamaton suunta -> organisaation mittariston oletus
+    meta = metric_meta(org_id)
+    direction = metric.map(lambda m: meta.get(m, {}).get("direction", "up")).astype(object)
+    if "direction" in data:
+        given = data["direction"].astype("string").str.extract(r"^\s*(up|down)\b", flags=re.I)[0].str.lower()
+        direction = given.astype(object).where(given.notna(), direction)
+
+    out = pd.DataFrame({
+        "date": _parse_dates(data["date"]),
+        "metric": metric,
+        "value": clean_numbers(data["value"]),
+        "target": clean_numbers(column("target")),
+        "warning": clean_numbers(column("warning")),
+        "direction": direction,
+    })
+
+    reason = np.select(
+        [out["metric"].isna(), out["date"].isna(), out["value"].isna()],
+        ["Tuntematon mittari", "Päivämäärä ei kelpaa", "Arvo ei ole numero"],
+        default="",
+    )
+    bad = reason != ""
+    rejected = data[bad].assign(Syy=reason[bad])
+    return out[~bad].reset_index(drop=True), rejected
+
+
+def dedupe(rows: pd.DataFrame, existing: pd.DataFrame) -> tuple[pd.DataFrame, int]:
+    # Poistaa tiedoston sisäiset tuplat (viimeinen jää) sekä rivit, joiden
+    # (metric, date) on jo tallennettu. existing: normalisoitu kehys.
+    rows = rows.drop_duplicates(subset=["metric", "date"], keep="last")
+    before = len(rows)
+    if not existing.empty:
+        keys = pd.MultiIndex.from_arrays([rows["metric"], rows["date"]])
+        stored = pd.MultiIndex.from_arrays([
+            existing.index.get_level_values("metric").astype(str),
+            existing.index.get_level_values("date").as_unit("ns"),
+        ])
+        rows = rows[~keys.isin(stored)]
+    return rows.sort_values(["date", "metric"]).reset_index(drop=True), before - len(rows)
+
+
+def to_records(rows: pd.DataFrame, import_key: str) -> list[dict]:
+    # JSON-kelpoiset rivit; puuttuvat rajat -> null
+    dates = rows["date"].dt.strftime("%Y-%m-%dT%H:%M:%S")
+    keys = dates.map(lambda d: str(uuid.uuid5(IMPORT_NAMESPACE, f"{import_key}/{d}")))
+    out = rows.assign(date=dates, snapshot_key=keys).astype(object)
+    return out.where(out.notna(), None).to_dict("records")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Historian massatuonti kpi_snapshots-tauluun")
+    parser.add_argument("path", help="CSV- tai Excel-tiedosto")
+    parser.add_argument("--org", default=DEFAULT_ORG, choices=ORGS, help="organisaatio")
+    parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE,
+                        help="rivejä per pyyntö")
+    parser.add_argument("--dry-run", action="store_true", help="vain validointi, ei kirjoitusta")
+    args = parser.parse_args()
+
+    with open(args.path, "rb") as f:
+        content = f.read()
+    rows, rejected = validate(read_table(args.path, content), args.org)
+    # Tuplatarkistukseen luetaan vain tiedoston päiväväli (indeksoitu haku)
+    start = rows["date"].min() if len(rows) else pd.Timestamp.now()
+    end = rows["date"].max() + pd.Timedelta(days=1) if len(rows) else start
+    rows, duplicates = dedupe(rows, load_history(f"{start:%Y-%m-%d}", f"{end:%Y-%m-%d}", args.org))
+    print(f"kelvollisia {len(rows)}, hylättyjä {len(rejected)}, jo tallennettuja/tuplia {duplicates}")
+    if len(rejected):
+        print(rejected.head(20).to_string())
+    if args.dry_run or rows.empty:
+        return
+
+    def progress(done, total):
+        print(f"\r{done}/{total}", end="", file=sys.stderr)
+
+    written = bulk_insert(to_records(rows, import_id(content, args.org)), chunk_size=args.chunk_size,
+                          on_progress=progress, org=args.org)
+    print(f"\ntallennettu {written} riviä")
+
+
+if __name__ == "__main__":
+    main()
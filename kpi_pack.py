@@ -0,0 +1,162 @@
+"""Board pack: Board View yhtenä itsenäisenä HTML-tiedostona (valinnaisesti PDF) kokouksiin.
+
+Sivu kootaan kerran valmiista Board-dokumentista (ks. kpi_payload.py). Tyylit ja
+harvennetut kuvaajat ovat tiedoston sisällä, joten paketin voi jakaa ja avata
+ilman Streamlitiä tai tietokantaa. Sama datan versio tuottaa saman paketin:
+uusi rakennetaan vain, kun data on muuttunut.
+
+Ajo: python kpi_pack.py [--org seura] [--out reports] [--pdf] [--force]
+(SUPABASE_URL ja SUPABASE_KEY ympäristömuuttujista)
+"""
+import argparse
+import hashlib
+import html
+import sys
+from datetime import datetime
+from pathlib import Path
+
+from kpi_cards import BOARD_CSS, category_grid, risk_summary
+from kpi_charts import forecast_svg
+from kpi_forecast import BAND_PERCENTILES, HORIZON_MONTHS
+from kpi_payload import forecast_frames, range_sparks
+from metrics_definitions import ALL_METRICS, CASH_DETAIL_METRICS
+
+DEFAULT_OUT = Path(__file__).parent / "reports"
+TITLE = "Hallituksen strateginen tilannekuva"
+
+PACK_CSS = """
+body{
+  background: var(--bg);
+  color: var(--text);
+  font-family: system-ui, -apple-system, "Segoe UI", Roboto, sans-serif;
+  max-width: 1280px;
+  margin: 1.5rem auto;
+  padding: 0 1rem;
+}
+.pack-meta{ color: var(--muted); font-size: 0.82rem; margin-bottom: 1rem; }
+.pack-columns{ display: grid; grid-template-columns: 1fr 1fr; gap: .75rem; }
+.kpi-forecast{ display: block; margin: .5rem 0; }
+section{ margin-bottom: 1.25rem; }
+
+@page{ size: A4 landscape; margin: 10mm; }
+@media print{
+  body{ margin: 0; max-width: none; -webkit-print-color-adjust: exact; print-color-adjust: exact; }
+  .kpi-card, .risk-box, section{ break-inside: avoid; }
+}
+"""
+
+
+def version_key(version: str) -> str:
+    # Tiedostonimeen sopiva tunniste datan versiolle
+    return hashlib.sha1(str(version).encode()).hexdigest()[:10]
+
+
+def render_pack(payload: dict, generated_at: datetime | None = None) -> str:
+    generated_at = generated_at or datetime.now()
+    metrics = payload["metrics"]
+    analytics = payload.get("analytics", {})
+    org = payload.get("org")
+
+    sections = []
+    # Ennen organisaatioita tallennetuissa dokumenteissa ei ole mittaristoa
+    for category, metric_list in payload.get("categories", ALL_METRICS).items():
+        visible_metrics = [m for m in metric_list if m not in CASH_DETAIL_METRICS]
+        sparks = range_sparks(payload, visible_metrics)
+        grid = category_grid(category, visible_metrics, metrics, sparks, analytics, org=org)
+        sections.append(f"<section>{grid}</section>")
+
+    def metric_list_html(names, empty):
+        if not names:
+            return f"<p>{empty}</p>"
+        return "<ul>" + "".join(f"<li>{html.escape(m)}</li>" for m in names) + "</ul>"
+
+    sections.append(
+        "<section><h2>Tilanne nyt</h2>"
+        + risk_summary(len(payload["critical"]), len(payload["warning"]),
+                       "Board pack on tulostettava tilannekuva. Päivitykset tehdään Ylläpito-sivulla.")
+        + "</section>"
+        + '<section class="pack-columns">'
+        + "<div><h3>🔴 Kriittiset</h3>" + metric_list_html(payload["critical"], "Ei kriittisiä mittareita.") + "</div>"
+        + "<div><h3>🟡 Varoitusalueella</h3>"
+        + metric_list_html(payload["warning"], "Ei varoitusalueella olevia mittareita.") + "</div>"
+        + "</section>"
+    )
+
+    frames = forecast_frames(payload)
+    if frames is not None:
+        balances, band = frames
+        low, mid, high = BAND_PERCENTILES
+        sections.append(
+            f"<section><h2>Kassaennuste {HORIZON_MONTHS} kk</h2>"
+            + forecast_svg(balances, band)
+            + f'<div class="pack-meta">Toteuma (sininen), perusura p{mid} (katkoviiva) ja '
+              f"haarukka p{low}–p{high} (varjostus).</div></section>"
+        )
+
+    built_at = datetime.fromisoformat(payload["built_at"]) if payload.get("built_at") else generated_at
+    meta = (f"Data {built_at:%d.%m.%Y %H:%M} · koottu {generated_at:%d.%m.%Y %H:%M} · "
+            f"versio {html.escape(str(payload['data_version']))}")
+    return (
+        '<!DOCTYPE html><html lang="fi"><head><meta charset="utf-8">'
+        f'<meta name="kpi-data-version" content="{html.escape(str(payload["data_version"]))}">'
+        f"<title>{TITLE} {generated_at:%d.%m.%Y}</title>"
+        f"<style>{BOARD_CSS}{PACK_CSS}</style></head><body>"
+        f"<h1>{TITLE}</h1><div class=\"pack-meta\">{meta}</div>"
+        + "".join(sections)
+        + "</body></html>"
+    )
+
+
+def write_pdf(html_text: str, path: Path):
+    # Valinnainen riippuvuus: pip install weasyprint
+    from weasyprint import HTML
+
+    HTML(string=html_text).write_pdf(path)
+
+
+def write_pack(payload: dict, out_dir: Path, pdf: bool = False, force: bool = False) -> tuple[Path, bool]:
+    # Palauttaa (HTML-tiedosto, rakennettiinko uusi). Saman datan version
+    # paketti käytetään sellaisenaan; offline-dokumentti rakennetaan aina.
+    out_dir.mkdir(parents=True, exist_ok=True)
+    key = version_key(payload["data_version"])
+    existing = sorted(out_dir.glob(f"board-pack-*-{key}.html"))
+    reuse = existing and not force and not payload.get("offline")
+    if reuse:
+        path = existing[-1]
+        html_text = None
+    else:
+        generated_at = datetime.now()
+        html_text = render_pack(payload, generated_at)
+        path = out_dir / f"board-pack-{generated_at:%Y%m%d-%H%M}-{key}.html"
+        path.write_text(html_text, encoding="utf-8")
+
+    if pdf and (not reuse or not path.with_suffix(".pdf").exists()):
+        write_pdf(html_text or path.read_text(encoding="utf-8"), path.with_suffix(".pdf"))
+    return path, not reuse
+
+
+def main():
+    # Tuodaan vasta ajettaessa, jotta render_pack toimii ilman tietokantayhteyttä
+    from kpi_data import DEFAULT_ORG, ORGS, load_board_payload
+
+    parser = argparse.ArgumentParser(description="Board View itsenäiseksi HTML/PDF-paketiksi")
+    parser.add_argument("--org", default=DEFAULT_ORG, choices=ORGS, help="organisaatio")
+    parser.add_argument("--out", type=Path, default=DEFAULT_OUT, help="kohdehakemisto")
+    parser.add_argument("--pdf", action="store_true", help="myös PDF (vaatii weasyprint-paketin)")
+    parser.add_argument("--force", action="store_true", help="rakenna, vaikka data ei ole muuttunut")
+    args = parser.parse_args()
+
+    payload = load_board_payload(args.org)
+    if not payload["metrics"]:
+        sys.exit("Ei tallennettua dataa.")
+    # Versiot ovat organisaatiokohtaisia -> muiden kuin oletusorganisaation paketit omiin hakemistoihinsa
+    out_dir = args.out if args.org == DEFAULT_ORG else args.out / args.org
+    try:
+        path, built = write_pack(payload, out_dir, pdf=args.pdf, force=args.force)
+    except ImportError:
+        sys.exit("PDF vaatii WeasyPrint-paketin: pip install weasyprint")
+    print(f"{'Rakennettu' if built else 'Data ei ole muuttunut, käytetään'}: {path}")
+
+
+if __name__ == "__main__":
+    main()
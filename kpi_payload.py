@@ -0,0 +1,202 @@
+"""Board Viewn valmiiksi laskettu sisältö yhtenä JSON-dokumenttina.
+
+Ylläpidon tallennus ja päivittäinen workflow rakentavat dokumentin kerran,
+ja Board View lukee sen yhdellä pyynnöllä (ks. sql/004_kpi_board_payload.sql).
+
+Ajo: python kpi_payload.py [--org seura ...]  (SUPABASE_URL ja SUPABASE_KEY ympäristömuuttujista;
+oletuksena kaikki KPI_ORGS-organisaatiot)
+"""
+import argparse
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from kpi_charts import downsample, sparkline_svg
+from kpi_rollups import DEFAULT_RANGE, GRAINS, TREND_RANGES, range_grain
+from kpi_status import CRITICAL, WARNING, compute_status
+from metrics_definitions import ALL_METRICS, CASH_DETAIL_METRICS
+
+DATE_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+
+def _number(x):
+    return None if x is None or pd.isna(x) else float(x)
+
+
+def _series(dates, **columns) -> dict:
+    return {
+        "date": [d.strftime(DATE_FORMAT) for d in pd.to_datetime(dates)],
+        **{name: [_number(v) for v in values] for name, values in columns.items()},
+    }
+
+
+def metric_rows(latest: pd.DataFrame, org: str | None = None) -> dict[str, dict]:
+    # Normalisoidusta kehyksestä (yksi rivi per mittari) korttien rivit statuksineen
+    metrics = {}
+    if latest.empty:
+        return metrics
+    latest = latest.assign(status=compute_status(latest, org))
+    for (metric_name, date), row in latest.iterrows():
+        metrics[str(metric_name)] = {
+            "date": date.strftime(DATE_FORMAT),
+            "value": _number(row["value"]),
+            "target": _number(row["target"]),
+            "warning": _number(row["warning"]),
+            "direction": None if pd.isna(row["direction"]) else str(row["direction"]),
+            "status": row["status"],
+        }
+    return metrics
+
+
+def analytics_rows(analytics: pd.DataFrame) -> dict[str, dict]:
+    # trend_analytics-tulos korttien trendiriveiksi
+    return {
+        str(r.Index): {
+            "mean": _number(r.mean),
+            "slope": _number(r.slope),
+            "zscore": _number(r.zscore),
+            "trend": r.trend,
+            "improving": bool(r.improving),
+            "crossing": None if pd.isna(r.crossing) else r.crossing.strftime(DATE_FORMAT),
+        }
+        for r in analytics.itertuples()
+    }
+
+
+def exceptions(metrics: dict[str, dict], categories: dict[str, list[str]] = ALL_METRICS) -> tuple[list[str], list[str]]:
+    # (kriittiset, varoitukset) korttien järjestyksessä
+    visible_all = [m for metric_list in categories.values() for m in metric_list if m not in CASH_DETAIL_METRICS]
+    status = {name: m["status"] for name, m in metrics.items()}
+    return (
+        [m for m in visible_all if status.get(m) == CRITICAL],
+        [m for m in visible_all if status.get(m) == WARNING],
+    )
+
+
+def range_series(trends: dict[str, pd.DataFrame], rollups: dict[str, pd.DataFrame],
+                 max_points: int) -> dict[str, dict[str, dict]]:
+    # Trendikuvaajien aikavälit (TREND_RANGES): lyhyt väli raakapisteinä,
+    # pitkät koosteina (jakson viimeisin arvo sekä min–max), joten pisteiden
+    # määrä ei kasva historian mukana. Välit lasketaan viimeisimmästä rivistä,
+    # ja tarkkuus valitaan välin todellisesta kattavuudesta (range_grain).
+    end = max((t["date"].iloc[-1] for t in trends.values() if len(t)), default=None)
+    begin = min((t["date"].iloc[0] for t in trends.values() if len(t)), default=None)
+    ranges = {}
+    for key, (_, grain, days) in TREND_RANGES.items():
+        start = None if days is None or end is None else end - pd.Timedelta(days=days)
+        grain = range_grain(grain, begin if start is None else max(start, begin), end)
+        series = {}
+        if grain is None or grain not in rollups:
+            for metric_name, trend in trends.items():
+                if start is not None:
+                    trend = trend[trend["date"] >= start]
+                trend = downsample(trend, max_points)
+                series[metric_name] = _series(trend["date"], value=trend["value"])
+        else:
+            frame = rollups[grain]
+            if start is not None:
+                frame = frame[frame["period"] >= f"{start.to_period(GRAINS[grain]).start_time:%Y-%m-%d}"]
+            for metric_name, rows in frame.groupby("metric", sort=False):
+                series[metric_name] = _series(rows["date"], value=rows["value"], min=rows["min"], max=rows["max"])
+        ranges[key] = series
+    return ranges
+
+
+def build_payload(version: str, latest: pd.DataFrame, trends: dict[str, pd.DataFrame],
+                  cash: tuple[pd.Series, dict | None], analytics: pd.DataFrame, max_points: int,
+                  categories: dict[str, list[str]] = ALL_METRICS, seasons: list[str] = (),
+                  rollups: dict[str, pd.DataFrame] | None = None, org: str | None = None) -> dict:
+    # latest: normalisoitu viimeisin-kehys, trends: prepare_trends-tulos,
+    # cash: load_cash_forecast-tulos, analytics: trend_analytics-tulos,
+    # categories: organisaation mittaristo, seasons: kaudet, joilta on dataa,
+    # rollups: koosteet tarkkuuksittain (load_rollups), org: metatietojen organisaatio.
+    # Trendit harvennetaan valmiiksi aikaväleittäin (ranges); SVG-sparklinet
+    # piirretään niistä lukuhetkellä (range_sparks).
+    metrics = metric_rows(latest, org)
+    critical, warning = exceptions(metrics, categories)
+
+    balances, forecast = cash
+    if forecast is not None:
+        band = forecast["band"]
+        forecast = {
+            **{k: v for k, v in forecast.items() if k != "band"},
+            "balances": _series(balances.index, value=balances.to_numpy()),
+            "band": _series(band["date"], p10=band["p10"], p50=band["p50"], p90=band["p90"]),
+        }
+
+    return {
+        "data_version": version,
+        "built_at": datetime.now().isoformat(timespec="seconds"),
+        "org": org,
+        "categories": categories,
+        "seasons": list(seasons),
+        "metrics": metrics,
+        "critical": critical,
+        "warning": warning,
+        "ranges": range_series(trends, rollups or {}, max_points),
+        "analytics": analytics_rows(analytics),
+        "forecast": forecast,
+    }
+
+
+# --- Lukupuoli: dokumentista kuvaajien tarvitsemat sarjat ---
+def trend_frames(payload: dict, metric_names: list[str]) -> dict[str, pd.DataFrame]:
+    # Ennen aikavälejä tallennettu dokumentti: koko historian trendit
+    return {
+        name: pd.DataFrame({"date": pd.to_datetime(s["date"]), "value": np.asarray(s["value"], dtype="float64")})
+        for name, s in payload["trends"].items()
+        if name in metric_names
+    }
+
+
+def range_frames(payload: dict, metric_names: list[str], range_key: str) -> dict[str, pd.DataFrame]:
+    # Valitun aikavälin sarjat (date, value ja koosteille min/max). Aiemmin
+    # tallennetussa dokumentissa ei ole aikavälejä -> koko historian trendit.
+    ranges = payload.get("ranges")
+    if ranges is None:
+        return trend_frames(payload, metric_names)
+    return {
+        name: pd.DataFrame({
+            "date": pd.to_datetime(s["date"]),
+            **{k: np.asarray(v, dtype="float64") for k, v in s.items() if k != "date"},
+        })
+        for name, s in ranges[range_key].items()
+        if name in metric_names
+    }
+
+
+def range_sparks(payload: dict, metric_names: list[str], range_key: str = DEFAULT_RANGE) -> dict[str, str]:
+    # Kevyen tilan ja board packin SVG-sparklinet valitulta aikaväliltä; sarjat
+    # on jo harvennettu, joten piirto on pelkkää merkkijonojen koostamista
+    return {
+        name: sparkline_svg(trend, max(len(trend), 2))
+        for name, trend in range_frames(payload, metric_names, range_key).items()
+    }
+
+
+def forecast_frames(payload: dict) -> tuple[pd.Series, pd.DataFrame] | None:
+    forecast = payload.get("forecast")
+    if forecast is None:
+        return None
+    balances = pd.Series(forecast["balances"]["value"], index=pd.to_datetime(forecast["balances"]["date"]))
+    band = pd.DataFrame(forecast["band"]).assign(date=lambda d: pd.to_datetime(d["date"]))
+    return balances, band
+
+
+def main():
+    # Tuodaan vasta ajettaessa: kpi_data käyttää tätä moduulia
+    from kpi_data import ORGS, materialize_board
+
+    parser = argparse.ArgumentParser(description="Board-dokumentin rakennus organisaatioittain")
+    parser.add_argument("--org", nargs="+", default=ORGS, choices=ORGS, help="organisaatiot (oletus kaikki)")
+    args = parser.parse_args()
+
+    for org in args.org:
+        payload = materialize_board(org)
+        print(f"Board-dokumentti rakennettu ({org}): versio {payload['data_version']}, "
+              f"{len(payload['metrics'])} mittaria, {len(payload['ranges'][DEFAULT_RANGE])} trendiä")
+
+
+if __name__ == "__main__":
+    main()
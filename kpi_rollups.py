@@ -0,0 +1,118 @@
+import numpy as np
+import pandas as pd
+
+import kpi_store
+from kpi_status import compute_status
+from kpi_transform import is_normalized, normalize_snapshots, parse_dates
+
+# Kuukausi- ja neljännesvuosikoosteet paikallisessa tallenteessa. Jokainen
+# kirjoitus (tallennus, tuonti, synkronointi) laskee uudelleen vain ne jaksot,
+# joihin kirjoitetut rivit osuvat, joten pitkän aikavälin kuvaajat luetaan
+# valmiista riveistä historian pituudesta riippumatta.
+
+GRAINS = {"month": "M", "quarter": "Q"}
+
+# Trendikuvaajien aikavälit: (otsikko, karkein koosteen tarkkuus tai None = raakapisteet,
+# päiviä taaksepäin viimeisimmästä rivistä tai None = koko historia)
+TREND_RANGES = {
+    "3m": ("3 kk", None, 92),
+    "1y": ("1 v", "month", 365),
+    "all": ("Kaikki", "quarter", None),
+}
+DEFAULT_RANGE = "all"
+# Tätä lyhyempi todellinen väli näytetään aina raakapisteinä (LTTB-harvennettuna)
+RAW_WINDOW_DAYS = 92
+# Koosteisiin siirrytään vain, jos jaksoja kertyy vähintään näin monta;
+# muuten kokeillaan tarkempaa koostetta ja lopulta raakapisteitä
+MIN_ROLLUP_POINTS = 12
+
+# Kasvatetaan, kun koosteiden laskenta muuttuu: koosteet lasketaan uudelleen koko historiasta
+ROLLUPS_VERSION = "2"
+
+
+def range_grain(grain: str | None, first, last) -> str | None:
+    # Aikavälin tarkkuus datan todellisesta kattavuudesta (first–last): nuori
+    # historia näytetään raakapisteinä, vaikka väli olisi määritelty koosteeksi
+    if grain is None or first is None or last - first <= pd.Timedelta(days=RAW_WINDOW_DAYS):
+        return None
+    finer = list(GRAINS)[:list(GRAINS).index(grain) + 1]
+    for candidate in reversed(finer):
+        if len(pd.period_range(first, last, freq=GRAINS[candidate])) >= MIN_ROLLUP_POINTS:
+            return candidate
+    return None
+
+
+def rollup(data: pd.DataFrame, grain: str, org: str | None = None) -> pd.DataFrame:
+    # Yksi rivi per (mittari, jakso): period = jakson alku, date/value = jakson
+    # viimeisin rivi, mean/min/max/count numeerisista arvoista ja status jakson
+    # lopun arvolla ja rajoilla. Normalisoitu kehys on järjestetty (metric, date),
+    # joten jaksot ovat yhtenäisiä lohkoja (np.*.reduceat, kuten trendianalytiikassa).
+    if not is_normalized(data):
+        data = normalize_snapshots(data)
+    if data.empty:
+        return pd.DataFrame(columns=kpi_store.ROLLUP_COLUMNS[2:])
+
+    metric = data.index.get_level_values("metric")
+    codes = np.asarray(metric.codes if hasattr(metric, "codes") else pd.factorize(metric)[0])
+    periods = data.index.get_level_values("date").to_period(GRAINS[grain]).start_time
+    period_ns = periods.asi8
+    starts = np.flatnonzero(np.concatenate([[True], (codes[1:] != codes[:-1]) | (period_ns[1:] != period_ns[:-1])]))
+    ends = np.append(starts[1:], len(codes)) - 1
+
+    values = data["value"].to_numpy(dtype="float64")
+    count = np.add.reduceat(~np.isnan(values), starts)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.add.reduceat(np.nan_to_num(values), starts) / count
+    last = data.iloc[ends]
+
+    return pd.DataFrame({
+        "metric": np.asarray(metric[ends].astype(str)),
+        "period": periods[ends].strftime("%Y-%m-%d"),
+        "date": last.index.get_level_values("date").strftime("%Y-%m-%dT%H:%M:%S"),
+        "value": last["value"].to_numpy(),
+        "mean": np.where(count > 0, mean, np.nan),
+        # fmin/fmax ohittavat puuttuvat arvot
+        "min": np.fmin.reduceat(values, starts),
+        "max": np.fmax.reduceat(values, starts),
+        "count": count,
+        "target": last["target"].to_numpy(),
+        "warning": last["warning"].to_numpy(),
+        "direction": last["direction"].astype(object).to_numpy(),
+        "status": compute_status(last, org).to_numpy(),
+    })
+
+
+def refresh(conn, org: str, start, end) -> int:
+    # Laskee uudelleen koosteet, joiden jaksoon osuu päiviä välillä start–end
+    # (ISO-päivät tai aikaleimat). Luetaan vain kattavien neljännesten rivit.
+    start, end = parse_dates([start, end])
+    first = start.to_period("Q").start_time
+    last = end.to_period("Q").end_time
+    data = normalize_snapshots(
+        kpi_store.read_history(conn, org, f"{first:%Y-%m-%d}", f"{last:%Y-%m-%d}T23:59:59.999999")
+    )
+    frames = {grain: rollup(data, grain, org) for grain in GRAINS}
+    return kpi_store.write_rollups(conn, org, frames, f"{first:%Y-%m-%d}", f"{last:%Y-%m-%d}")
+
+
+def refresh_rows(conn, org: str, rows: list[dict]) -> int:
+    # Kirjoitettujen rivien jaksot; päivämäärät ovat ISO-merkkijonoja tai aikaleimoja
+    dates = parse_dates([row["date"] for row in rows if row.get("date")])
+    if len(dates) == 0:
+        return 0
+    return refresh(conn, org, dates.min(), dates.max())
+
+
+def rebuild(conn, org: str):
+    # Koosteet koko historiasta
+    first, last = kpi_store.date_span(conn, org)
+    if first is not None:
+        refresh(conn, org, first, last)
+    kpi_store.set_state(conn, org, rollups=ROLLUPS_VERSION)
+
+
+def ensure(conn, org: str):
+    # Ennen koosteita (tai vanhemmalla laskennalla) tallennettu kopio lasketaan
+    # kerran kokonaan; sen jälkeen kirjoitukset päivittävät vain omat jaksonsa
+    if kpi_store.get_state(conn, org).get("rollups") != ROLLUPS_VERSION:
+        rebuild(conn, org)
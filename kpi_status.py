@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+
+from kpi_transform import clean_numbers
+from metrics_definitions import metric_meta
+
+OK = "🟢"
+WARNING = "🟡"
+CRITICAL = "🔴"
+UNKNOWN = "⚪"
+
+
+def compute_status(df: pd.DataFrame, org: str | None = None) -> pd.Series:
+    # Status koko DataFramelle kerralla (viimeisimmät arvot tai koko historia).
+    # Sarakkeet: value, target, warning, direction (+ metric sarakkeena tai
+    # indeksitasona, jos suunta puuttuu; oletussuunta organisaation mittaristosta).
+    # Ei-numeeriset arvot -> ⚪.
+    if df.empty:
+        return pd.Series([], index=df.index, dtype=object)
+
+    value = clean_numbers(df["value"]).to_numpy()
+    target = clean_numbers(df["target"]).to_numpy()
+    warning = clean_numbers(df["warning"]).to_numpy()
+
+    direction = df["direction"].astype(object) if "direction" in df else pd.Series(np.nan, index=df.index)
+    # Mittarin nimi on joko sarake tai normalisoidun kehyksen indeksitaso
+    if "metric" in df:
+        metric = df["metric"]
+    elif "metric" in df.index.names:
+        metric = pd.Series(df.index.get_level_values("metric"), index=df.index)
+    else:
+        metric = None
+    if metric is not None:
+        meta = metric_meta(org)
+        default_direction = metric.astype(object).map(lambda m: meta.get(m, {}).get("direction", "up"))
+        direction = direction.fillna(default_direction)
+    up = (direction.astype(str) == "up").to_numpy()
+
+    with np.errstate(invalid="ignore"):
+        status = np.select(
+            [
+                np.isnan(value) | np.isnan(target) | np.isnan(warning),
+                np.where(up, value >= target, value <= target),
+                np.where(up, value >= warning, value <= warning),
+            ],
+            [UNKNOWN, OK, WARNING],
+            default=CRITICAL,
+        )
+    return pd.Series(status, index=df.index)
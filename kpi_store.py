@@ -0,0 +1,236 @@
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+COLUMNS = ["org_id", "date", "metric", "value", "target", "warning", "direction", "season", "id"]
+# Kuukausi-/neljännesvuosikoosteet (ks. kpi_rollups.py)
+ROLLUP_COLUMNS = ["org_id", "grain", "metric", "period", "date", "value", "mean", "min", "max", "count",
+                  "target", "warning", "direction", "status"]
+
+DEFAULT_PATH = Path(__file__).parent / "data" / "snapshots.sqlite"
+
+# Arvot tallennetaan sellaisenaan (ei tyyppimuunnosta), jotta paikallinen kopio
+# vastaa täsmälleen Supabasen rivejä. Sama (org_id, metric, date) korvaa aiemman
+# rivin, joten päällekkäiset delta-haut ovat turvallisia. Jokainen organisaatio
+# on oma osionsa pääavaimen ja indeksien alussa.
+SCHEMA = """
+create table if not exists snapshots (
+    org_id text not null,
+    date text not null,
+    metric text not null,
+    value,
+    target,
+    warning,
+    direction text,
+    season text,
+    id integer,
+    primary key (org_id, metric, date)
+);
+create index if not exists snapshots_org_date_idx on snapshots (org_id, date);
+create table if not exists sync_state (
+    key text primary key,
+    value text
+);
+create table if not exists rollups (
+    org_id text not null,
+    grain text not null,
+    metric text not null,
+    period text not null,
+    date text,
+    value real,
+    mean real,
+    min real,
+    max real,
+    count integer,
+    target real,
+    warning real,
+    direction text,
+    status text,
+    primary key (org_id, grain, metric, period)
+);
+"""
+# Kasvatetaan, kun SCHEMA muuttuu, ja lisätään MIGRATIONS-siirto edellisestä versiosta
+SCHEMA_VERSION = 3
+
+# Organisaatio, jolle ennen organisaatioita tallennettu data siirretään (sama kuin sql/005)
+LEGACY_ORG = "default"
+
+# Siirrot paikallaan: KPI_BACKEND=sqlite -tilassa tiedosto on datan ainoa kopio,
+# joten sitä ei saa poistaa. {vanha versio: skripti, joka vie version eteenpäin}
+MIGRATIONS = {
+    # 2 -> 3: org_id ja season, pääavain (org_id, metric, date), tilan avaimet organisaatiolle
+    2: f"""
+begin;
+create table snapshots_v3 (
+    org_id text not null,
+    date text not null,
+    metric text not null,
+    value,
+    target,
+    warning,
+    direction text,
+    season text,
+    id integer,
+    primary key (org_id, metric, date)
+);
+-- Kausi kalenterivuotena kuten sql/005 (vrt. KPI_SEASON_START)
+insert into snapshots_v3 (org_id, date, metric, value, target, warning, direction, season, id)
+    select '{LEGACY_ORG}', date, metric, value, target, warning, direction, substr(date, 1, 4), id
+    from snapshots;
+drop table snapshots;
+alter table snapshots_v3 rename to snapshots;
+update sync_state set key = '{LEGACY_ORG}:' || key;
+pragma user_version = 3;
+commit;
+""",
+}
+
+
+def _migrate(conn: sqlite3.Connection):
+    version = conn.execute("pragma user_version").fetchone()[0]
+    if version > SCHEMA_VERSION:
+        raise RuntimeError(f"Paikallinen tallenne on uudempaa muotoa ({version}) kuin tämä versio ({SCHEMA_VERSION})")
+    if version < min(MIGRATIONS) or not conn.execute(
+        "select 1 from sqlite_master where type = 'table' and name = 'snapshots'"
+    ).fetchone():
+        # Uusi tiedosto tai versiot 0–1, jotka edeltävät sqlite-taustajärjestelmää
+        # ja ovat siis aina Supabasen kopioita: poistetaan ja haetaan uudelleen
+        conn.executescript("drop table if exists snapshots; drop table if exists sync_state;"
+                           f"drop table if exists rollups; pragma user_version = {SCHEMA_VERSION};")
+        return
+    for step in range(version, SCHEMA_VERSION):
+        conn.executescript(MIGRATIONS[step])
+
+
+@contextmanager
+def connect(path=None):
+    path = Path(path or DEFAULT_PATH)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)
+    try:
+        if conn.execute("pragma user_version").fetchone()[0] != SCHEMA_VERSION:
+            _migrate(conn)
+        conn.executescript(SCHEMA)
+        yield conn
+    finally:
+        conn.close()
+
+
+def last_synced_date(conn: sqlite3.Connection, org: str):
+    return conn.execute("select max(date) from snapshots where org_id = ?", (org,)).fetchone()[0]
+
+
+def last_synced_id(conn: sqlite3.Connection, org: str):
+    return conn.execute("select max(id) from snapshots where org_id = ?", (org,)).fetchone()[0]
+
+
+def append(conn: sqlite3.Connection, rows: list[dict], org: str) -> int:
+    # Rivit ilman org_id:tä (osioimaton Supabase) kuuluvat organisaatioon org
+    if not rows:
+        return 0
+    values = [tuple(r.get(c) for c in COLUMNS) for r in ({**r, "org_id": r.get("org_id") or org} for r in rows)]
+    with conn:
+        conn.executemany(
+            f"insert or replace into snapshots ({', '.join(COLUMNS)}) "
+            f"values ({', '.join('?' for _ in COLUMNS)})",
+            values,
+        )
+    return len(values)
+
+
+def read_history(conn: sqlite3.Connection, org: str, start=None, end=None) -> pd.DataFrame:
+    # Päivärajaus (ISO-merkkijonoina, molemmat mukaan lukien) käyttää (org_id, date) -indeksiä
+    where, params = ["org_id = ?"], [org]
+    if start is not None:
+        where.append("date >= ?")
+        params.append(str(start))
+    if end is not None:
+        where.append("date <= ?")
+        params.append(str(end))
+    return pd.read_sql_query(
+        f"select {', '.join(COLUMNS)} from snapshots where {' and '.join(where)} order by metric, date",
+        conn, params=params,
+    )
+
+
+def read_latest(conn: sqlite3.Connection, org: str) -> pd.DataFrame:
+    # Viimeisin rivi per mittari (org_id, metric, date) -pääavaimen kautta
+    return pd.read_sql_query(
+        f"select {', '.join(f's.{c}' for c in COLUMNS)} from snapshots s "
+        "join (select metric, max(date) as date from snapshots where org_id = ? group by metric) m "
+        "on s.org_id = ? and s.metric = m.metric and s.date = m.date order by s.metric",
+        conn, params=[org, org],
+    )
+
+
+def date_span(conn: sqlite3.Connection, org: str) -> tuple:
+    # (vanhin, uusin) päivä tai (None, None)
+    return conn.execute("select min(date), max(date) from snapshots where org_id = ?", (org,)).fetchone()
+
+
+def data_version(conn: sqlite3.Connection, org: str) -> str:
+    # insert or replace antaa korvatullekin riville uuden rowid:n, joten
+    # (rivimäärä, suurin rowid) muuttuu jokaisessa organisaation kirjoituksessa
+    count, top = conn.execute(
+        "select count(*), max(rowid) from snapshots where org_id = ?", (org,)
+    ).fetchone()
+    return f"local:{count}:{top}"
+
+
+# --- Koosteet ---
+def write_rollups(conn: sqlite3.Connection, org: str, frames: dict[str, pd.DataFrame], first: str, last: str) -> int:
+    # Korvaa organisaation koosteet jaksoilta first–last (jakson alkupäivä ISO-muodossa)
+    # yhdessä transaktiossa, jolloin lukija ei näe puolivalmista päivitystä
+    values = [
+        tuple(row.get(c) for c in ROLLUP_COLUMNS)
+        for grain, frame in frames.items()
+        for row in frame.assign(org_id=org, grain=grain).to_dict("records")
+    ]
+    with conn:
+        conn.execute("delete from rollups where org_id = ? and period >= ? and period <= ?", (org, first, last))
+        conn.executemany(
+            f"insert or replace into rollups ({', '.join(ROLLUP_COLUMNS)}) "
+            f"values ({', '.join('?' for _ in ROLLUP_COLUMNS)})",
+            values,
+        )
+    return len(values)
+
+
+def read_rollups(conn: sqlite3.Connection, org: str, grain: str, start=None) -> pd.DataFrame:
+    # Jaksot alkaen start (jakson alkupäivä ISO-muodossa), järjestyksessä (metric, period)
+    where, params = ["org_id = ?", "grain = ?"], [org, grain]
+    if start is not None:
+        where.append("period >= ?")
+        params.append(str(start))
+    return pd.read_sql_query(
+        f"select {', '.join(ROLLUP_COLUMNS[2:])} from rollups where {' and '.join(where)} order by metric, period",
+        conn, params=params,
+    )
+
+
+# Synkronoinnin tila organisaatiokohtaisesti (avain "org:nimi")
+def set_state(conn: sqlite3.Connection, org: str, **values):
+    with conn:
+        conn.executemany(
+            "insert or replace into sync_state (key, value) values (?, ?)",
+            [(f"{org}:{k}", None if v is None else str(v)) for k, v in values.items()],
+        )
+
+
+def get_state(conn: sqlite3.Connection, org: str) -> dict:
+    prefix = f"{org}:"
+    rows = conn.execute(
+        "select key, value from sync_state where substr(key, 1, ?) = ?", (len(prefix), prefix)
+    ).fetchall()
+    return {key.split(":", 1)[1]: value for key, value in rows}
+
+
+def mark_synced(conn: sqlite3.Connection, org: str):
+    set_state(conn, org, synced_at=datetime.now().isoformat(timespec="seconds"), error=None)
+
+
+def mark_failed(conn: sqlite3.Connection, org: str, error: Exception):
+    set_state(conn, org, error=f"{type(error).__name__}: {error}")
@@ -0,0 +1,98 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+# Prosessin yhteiset mittaukset: viimeisimmät ajat per vaihe sekä
+# välimuistin osumat. Näytetään Ylläpito-sivun debug-paneelissa.
+HISTORY_PER_STAGE = 200
+
+log = logging.getLogger("kpi.timing")
+if os.environ.get("KPI_TIMING_LOG"):
+    # JSON-rivit stderriin: KPI_TIMING_LOG=1 streamlit run dashboard.py
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    log.addHandler(_handler)
+    log.setLevel(logging.INFO)
+    log.propagate = False
+
+_lock = threading.Lock()
+_spans = defaultdict(lambda: deque(maxlen=HISTORY_PER_STAGE))
+_cache_calls = defaultdict(int)
+_cache_misses = defaultdict(int)
+
+
+@contextmanager
+def span(stage: str, **fields):
+    # with span("fetch.sync") as s: ...; s["rows"] = n
+    info = dict(fields)
+    start = time.perf_counter()
+    try:
+        yield info
+    finally:
+        ms = (time.perf_counter() - start) * 1000
+        with _lock:
+            _spans[stage].append((ms, info.get("rows"), info.get("bytes")))
+        if log.isEnabledFor(logging.INFO):
+            log.info(json.dumps({"ts": time.time(), "stage": stage, "ms": round(ms, 2), **info}, default=str))
+
+
+def cache_call(name: str):
+    with _lock:
+        _cache_calls[name] += 1
+
+
+def cache_miss(name: str):
+    # Kutsutaan välimuistitetun funktion sisältä, eli vain kun tulos lasketaan
+    with _lock:
+        _cache_misses[name] += 1
+
+
+def stage_stats() -> pd.DataFrame:
+    with _lock:
+        snapshot = {stage: list(values) for stage, values in _spans.items()}
+
+    rows = []
+    for stage, values in sorted(snapshot.items()):
+        ms = np.array([v[0] for v in values])
+        last_rows = next((v[1] for v in reversed(values) if v[1] is not None), None)
+        last_bytes = next((v[2] for v in reversed(values) if v[2] is not None), None)
+        rows.append({
+            "Vaihe": stage,
+            "n": len(ms),
+            "p50 ms": round(float(np.percentile(ms, 50)), 1),
+            "p95 ms": round(float(np.percentile(ms, 95)), 1),
+            "Rivejä (viim.)": last_rows,
+            "kB (viim.)": None if last_bytes is None else round(last_bytes / 1024, 1),
+        })
+    return pd.DataFrame(rows)
+
+
+def cache_stats() -> pd.DataFrame:
+    with _lock:
+        calls = dict(_cache_calls)
+        misses = dict(_cache_misses)
+
+    rows = []
+    for name in sorted(calls):
+        n, miss = calls[name], min(misses.get(name, 0), calls[name])
+        rows.append({
+            "Välimuisti": name,
+            "Kutsuja": n,
+            "Osumia": n - miss,
+            "Osumaprosentti": round(100 * (n - miss) / n, 1) if n else None,
+        })
+    return pd.DataFrame(rows)
+
+
+def reset():
+    with _lock:
+        _spans.clear()
+        _cache_calls.clear()
+        _cache_misses.clear()
@@ -0,0 +1,140 @@
+import numpy as np
+import pandas as pd
+
+# Normalisoidun snapshot-kehyksen sarakkeet; metric ja date ovat indeksissä
+SNAPSHOT_COLUMNS = ["value", "target", "warning", "direction", "season"]
+
+
+def clean_number(v):
+    return pd.to_numeric(
+        str(v).replace("\u00a0", "").replace(" ", "").replace(",", "."),
+        errors="coerce"
+    )
+
+
+def clean_numbers(values: pd.Series) -> pd.Series:
+    # Sama sääntö kuin clean_number, mutta koko sarakkeelle kerralla
+    if pd.api.types.is_numeric_dtype(values):
+        return values.astype("float64")
+    text = (
+        values.astype(str)
+        .str.replace("\u00a0", "", regex=False)
+        .str.replace(" ", "", regex=False)
+        .str.replace(",", ".", regex=False)
+    )
+    return pd.to_numeric(text, errors="coerce")
+
+
+def parse_dates(values):
+    # ISO-päivät naiiveina UTC-aikoina: timestamptz-sarake palauttaa aikavyöhykkeen
+    # (+00:00), paikallinen tallenne ja sivujen vertailupäivät ovat naiiveja
+    dates = pd.to_datetime(values, errors="coerce", format="ISO8601", utc=True)
+    return dates.dt.tz_localize(None) if isinstance(dates, pd.Series) else dates.tz_localize(None)
+
+
+def season_labels(dates, start_month: int = 1) -> pd.Categorical:
+    # Kausi päivämäärästä: kalenterivuosi ("2024") tai, jos kausi alkaa muuna
+    # kuukautena, kaksivuotinen ("2024–25"). Nimet muodostetaan vain kerran
+    # per vuosi.
+    dates = pd.DatetimeIndex(dates)
+    years = dates.year.to_numpy() - (dates.month.to_numpy() < start_month)
+    unique, codes = np.unique(years, return_inverse=True)
+    if start_month == 1:
+        labels = [str(y) for y in unique]
+    else:
+        labels = [f"{y}–{(y + 1) % 100:02d}" for y in unique]
+    return pd.Categorical.from_codes(codes, categories=labels)
+
+
+def normalize_snapshots(data: pd.DataFrame, season_start: int = 1) -> pd.DataFrame:
+    # Haetut rivit (Supabase tai paikallinen tallenne) yhdeksi tiiviiksi kehykseksi:
+    # järjestetty (metric, date) -indeksi, metric/direction/season kategorioina ja
+    # numerot float64:nä. Molemmat sivut käyttävät tätä muotoa, joten
+    # päivämäärät ja luvut jäsennetään vain kerran. Tallentamaton kausi
+    # päätellään päivämäärästä.
+    def column(name):
+        return data[name] if name in data else pd.Series(np.nan, index=data.index)
+
+    out = pd.DataFrame({
+        "metric": column("metric").astype("category"),
+        "date": parse_dates(column("date")),
+        "value": clean_numbers(column("value")),
+        "target": clean_numbers(column("target")),
+        "warning": clean_numbers(column("warning")),
+        "direction": column("direction").astype("category"),
+    })
+    out = out.dropna(subset=["metric", "date"])
+    season = pd.Series(season_labels(out["date"], season_start), index=out.index)
+    if "season" in data:
+        stored = data["season"].loc[out.index]
+        season = stored.where(stored.notna(), season.astype(object))
+    out["season"] = season.astype("category")
+    out = out.sort_values(["metric", "date"], kind="stable")
+    out = out.drop_duplicates(subset=["metric", "date"], keep="last")
+    return out.set_index(["metric", "date"])
+
+
+def is_normalized(data: pd.DataFrame) -> bool:
+    return list(data.index.names) == ["metric", "date"]
+
+
+def as_of(data: pd.DataFrame, when) -> pd.DataFrame:
+    # Jokaisen mittarin viimeisin rivi hetkellä when (merge_asof-tyylinen haku).
+    # Normalisoitu kehys on järjestetty (metric, date), joten mittarit ovat
+    # yhtenäisinä lohkoina: yhdistetty avain (lohko, sekunnit) on kasvava, ja
+    # kaikkien mittarien rivit löytyvät yhdellä searchsorted-kutsulla.
+    if data.empty:
+        return data
+    metric = data.index.get_level_values("metric")
+    dates = data.index.get_level_values("date")
+
+    codes = np.asarray(metric.codes if hasattr(metric, "codes") else pd.factorize(metric)[0], dtype="int64")
+    block = np.concatenate([[0], np.cumsum(codes[1:] != codes[:-1])])
+    starts = np.flatnonzero(np.concatenate([[True], codes[1:] != codes[:-1]]))
+
+    seconds = dates.as_unit("s").asi8
+    key = (block << 32) | (seconds - seconds.min())
+    when_seconds = np.datetime64(pd.Timestamp(when), "s").astype("int64") - seconds.min()
+    if when_seconds < 0:
+        return data.iloc[:0]
+    query = (np.arange(len(starts), dtype="int64") << 32) | min(when_seconds, 2**32 - 1)
+
+    pos = np.searchsorted(key, query, side="right") - 1
+    return data.iloc[pos[pos >= starts]]
+
+
+def season_values(data: pd.DataFrame, season: str) -> pd.DataFrame:
+    # Jokaisen mittarin viimeisin rivi kauden sisällä (kauden lopputilanne)
+    rows = data[data["season"] == season]
+    return rows.groupby(level="metric", observed=True, sort=False).tail(1)
+
+
+def prepare_trends(data: pd.DataFrame) -> dict[str, pd.DataFrame]:
+    # Normalisoidusta kehyksestä suoraan mittarikohtaiset viipaleet.
+    # Palauttaa {mittari: DataFrame[date, value]} korttien trendikuvaajille.
+    if not is_normalized(data):
+        data = normalize_snapshots(data)
+    values = data["value"].dropna()
+    if values.empty:
+        return {}
+
+    return {
+        str(metric): group.droplevel("metric").reset_index()
+        for metric, group in values.groupby(level="metric", observed=True, sort=False)
+    }
+
+
+def changed_metrics(current: dict, latest: dict) -> list[str]:
+    # Mittarit, joiden arvo, rajat tai suunta poikkeavat viimeisimmästä
+    # tallennetusta. current/latest: {mittari: {"value", "target", "warning", "direction"}}
+    changed = []
+    for metric_name, row in current.items():
+        prev = latest.get(metric_name)
+        if prev is None or row["direction"] != prev["direction"]:
+            changed.append(metric_name)
+            continue
+        new = np.array([row["value"], row["target"], row["warning"]], dtype="float64")
+        old = np.array([prev["value"], prev["target"], prev["warning"]], dtype="float64")
+        if not np.allclose(new, old, rtol=0, atol=1e-9):
+            changed.append(metric_name)
+    return changed
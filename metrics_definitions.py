@@ -1,3 +1,8 @@
+import json
+import re
+from functools import lru_cache
+from pathlib import Path
+
 ALL_METRICS = {
     "ELINVOIMA": [
         "Pelaajamäärä yht.",
@@ -30,3 +35,135 @@ ALL_METRICS = {
         "Valmennuslinjan toteutuminen",
     ],
 }
+
+# Kassaennusteen erittely: näytetään Kassatilanne-kortin alla, ei omina kortteinaan
+CASH_DETAIL_METRICS = [
+    "Kassa – viimeisin toteuma",
+    "Kassa – keskimääräinen kk-muutos",
+    "Kassa – volatiliteetti",
+    "Kassa 6 kk – varovainen",
+    "Kassa 6 kk – perus",
+    "Kassa 6 kk – optimistinen",
+]
+
+
+# --- Mittarien metatiedot (yksikkö, suunta, kategoria) ---
+# Kootaan kerran importin yhteydessä, jotta muotoilu ja statuslaskenta eivät
+# joudu päättelemään yksikköä mittarin nimestä jokaisella kutsulla.
+
+METRIC_UNITS = {
+    "Lopettamis-% 13–15v": "pct",
+    "Kassatilanne + ennuste": "eur",
+    "Kassa – viimeisin toteuma": "eur",
+    "Kassa – keskimääräinen kk-muutos": "eur",
+    "Kassa – volatiliteetti": "eur",
+    "Kassa 6 kk – varovainen": "eur",
+    "Kassa 6 kk – perus": "eur",
+    "Kassa 6 kk – optimistinen": "eur",
+    "Tulosennuste": "eur",
+    "Kattavuus % (maksut/kulut)": "pct",
+    "Muut tuotot": "eur",
+    "Valmentajien pysyvyys": "pct",
+    "Koulutetut %": "pct",
+    "Valmentajamäärä/joukkue": "decimal",
+    "Pelaajatyytyväisyys": "score",
+    "Vanhempien tyytyväisyys": "score",
+    "Valmentajien/taustojen tyytyväisyys": "score",
+}
+
+# Mittarit, joissa pienempi arvo on parempi (muut: suurempi parempi)
+DOWN_METRICS = {
+    "Lopettamis-% 13–15v",
+    "Kassa – volatiliteetti",
+}
+
+
+def _fmt_number(x: float) -> str:
+    if abs(x) >= 1000:
+        return f"{x:,.0f}".replace(",", " ")
+    return f"{x:.1f}" if x % 1 != 0 else f"{x:.0f}"
+
+
+FORMATTERS = {
+    "eur": lambda x: f"{x:,.0f} €".replace(",", " "),
+    "pct": lambda x: f"{x:.0f} %",
+    "score": lambda x: f"{x:.1f} / 5",
+    "decimal": lambda x: f"{x:.1f}",
+    "number": _fmt_number,
+}
+
+METRICS = {
+    name: {
+        "category": category,
+        "unit": METRIC_UNITS.get(name, "number"),
+        "direction": "down" if name in DOWN_METRICS else "up",
+        "format": FORMATTERS[METRIC_UNITS.get(name, "number")],
+    }
+    for category, metric_list in ALL_METRICS.items()
+    for name in metric_list
+}
+
+
+def format_value(metric_name: str, x, org_id: str | None = None) -> str:
+    # x on jo siivottu numero (NaN -> "—"); yksikkö organisaation mittaristosta
+    if x is None or x != x:
+        return "—"
+    meta = metric_meta(org_id).get(metric_name)
+    return (meta["format"] if meta else _fmt_number)(x)
+
+
+def format_change(metric_name: str, x, org_id: str | None = None) -> str:
+    # Muutos etumerkillä; prosenttien ja asteikkojen muutos tarkemmin kuin itse arvo
+    if x is None or x != x:
+        return "—"
+    unit = metric_meta(org_id).get(metric_name, {}).get("unit", "number")
+    if unit == "pct":
+        return f"{x:+.1f} %-yks.".replace("-", "−", 1)
+    if unit in ("score", "decimal"):
+        return f"{x:+.2f}".replace("-", "−")
+    return ("+" if x >= 0 else "−") + format_value(metric_name, abs(x), org_id)
+
+
+# --- Organisaatiokohtaiset mittaristot ---
+# orgs/<org_id>.json korvaa oletusmittariston (ALL_METRICS) kyseiselle organisaatiolle:
+# {"name": "FC Esimerkki", "categories": {"ELINVOIMA": ["Pelaajamäärä yht.", ...], ...},
+#  "units": {"Uusi mittari": "pct"}, "down": ["Uusi mittari"]}
+# Yksiköt ja suunnat koskevat vain kyseistä organisaatiota (myös oletusmittariston
+# nimille): muotoilu ja statuslaskenta hakevat metatiedot parilla (organisaatio,
+# mittari), eikä yhteinen METRICS-rekisteri muutu. Tiedostot luetaan kerran per prosessi.
+ORGS_DIR = Path(__file__).parent / "orgs"
+ORG_ID_PATTERN = re.compile(r"[a-z0-9][a-z0-9_-]{0,63}")
+
+
+@lru_cache(maxsize=None)
+def org_definitions(org_id: str | None) -> dict:
+    # {"name": näyttönimi, "categories": {kategoria: [mittarit]}, "metrics": {mittari: metatiedot}}
+    path = ORGS_DIR / f"{org_id}.json"
+    if not org_id or not ORG_ID_PATTERN.fullmatch(org_id) or not path.exists():
+        return {"name": org_id, "categories": ALL_METRICS, "metrics": METRICS}
+
+    spec = json.loads(path.read_text(encoding="utf-8"))
+    units, down = spec.get("units", {}), set(spec.get("down", []))
+    # Oletusmetatiedot pohjana (myös muiden mittaristojen nimille), organisaation
+    # omat yksiköt ja suunnat päälle
+    metrics = dict(METRICS)
+    for category, metric_list in spec["categories"].items():
+        for name in metric_list:
+            default = METRICS.get(name, {})
+            unit = units.get(name, default.get("unit", "number"))
+            metrics[name] = {
+                "category": category,
+                "unit": unit,
+                "direction": "down" if name in down else default.get("direction", "up"),
+                "format": FORMATTERS[unit],
+            }
+    return {"name": spec.get("name", org_id), "categories": spec["categories"], "metrics": metrics}
+
+
+def org_metrics(org_id: str | None) -> dict[str, list[str]]:
+    return org_definitions(org_id)["categories"]
+
+
+def metric_meta(org_id: str | None) -> dict[str, dict]:
+    # Organisaation mittarien metatiedot (unit, direction, format, category)
+    return org_definitions(org_id)["metrics"]
@@ -1,40 +1,43 @@
 import streamlit as st
 import pandas as pd
-from supabase import create_client
+import hashlib
+import uuid
 from datetime import datetime
 
+from kpi_data import (ORGS, bulk_insert, current_org, insert_snapshot, load_cash_forecast, load_latest,
+                      load_snapshots)
+from kpi_import import dedupe, import_id, read_table, to_records, validate
+from kpi_forecast import HORIZON_MONTHS, SCENARIOS, cash_forecast, detail_values, read_balances
+from kpi_status import compute_status
+from kpi_timing import cache_stats, reset as reset_timings, stage_stats
+from kpi_transform import changed_metrics
+
 pin = st.text_input("Admin PIN", type="password")
 if pin != st.secrets["ADMIN_PIN"]:
     st.stop()
 
 st.set_page_config(layout="wide")
-st.title("Ylläpito – mittarien päivitys")
 
-# --- Supabase yhteys ---
-url = st.secrets["SUPABASE_URL"]
-key = st.secrets["SUPABASE_KEY"]
-supabase = create_client(url, key)
-
-# --- Statuslogiikka (vain esikatselua varten) ---
-def get_status(value, target, warning, direction):
-    if direction == "up":
-        if value >= target:
-            return "🟢"
-        elif value >= warning:
-            return "🟡"
-        else:
-            return "🔴"
-    else:
-        if value <= target:
-            return "🟢"
-        elif value <= warning:
-            return "🟡"
-        else:
-            return "🔴"
+# --- Organisaatio: lomake, tuonti ja tallennus koskevat vain sen osiota ---
+from metrics_definitions import org_definitions, org_metrics
 
+org = current_org()
+if org is None:
+    st.error("Tuntematon organisaatio.")
+    st.stop()
+
+st.title("Ylläpito – mittarien päivitys")
+if len(ORGS) > 1:
+    chosen_org = st.selectbox("Organisaatio", ORGS, index=ORGS.index(org),
+                              format_func=lambda o: org_definitions(o)["name"])
+    if chosen_org != org:
+        st.session_state["org"] = st.query_params["org"] = chosen_org
+        st.session_state.pop("snapshot_key", None)
+        st.session_state.pop("snapshot_date", None)
+        st.rerun()
 
-# --- Mittarit (kiinteästi hallituksen päättämät) ---
-from metrics_definitions import ALL_METRICS
+# --- Mittarit (kiinteästi hallituksen päättämät, organisaatiokohtaisesti) ---
+categories = org_metrics(org)
 
 # --- Oletusarvot (voit muokata myöhemmin) ---
 DEFAULTS = {
@@ -67,37 +70,96 @@ DEFAULTS = {
 }
 
 # --- Hae viimeisimmät arvot (esitäytetään lomake, jos löytyy) ---
-resp = supabase.table("kpi_snapshots").select("*").execute()
-hist = pd.DataFrame(resp.data)
+latest = load_latest(org)
 
 latest_by_metric = {}
-if not hist.empty:
-    hist["date"] = pd.to_datetime(hist["date"], errors="coerce")
-    latest = (
-        hist.sort_values("date")
-            .groupby("metric", as_index=False)
-            .tail(1)
-    )
-    for _, r in latest.iterrows():
-        latest_by_metric[str(r["metric"])] = {
+if not latest.empty:
+    for (metric_name, _), r in latest.iterrows():
+        if r[["value", "target", "warning"]].isna().any():
+            # Ei tulkittavissa numeroksi -> esitäyttö oletusarvoista
+            continue
+        latest_by_metric[str(metric_name)] = {
             "value": float(r["value"]),
             "target": float(r["target"]),
             "warning": float(r["warning"]),
-            "direction": str(r["direction"]),
+            "direction": "down" if r["direction"] == "down" else "up",
         }
 
 st.caption(
-    "Syötä arvot ja rajat. Lopuksi tallenna snapshot. "
-    "Tallennus tekee yhden rivin per mittari Supabaseen. "
-    "Kassan ennusteluvut päivitetään käsin Excel-mallista."
+    "Syötä arvot ja rajat ja esikatsele muutokset. Lopuksi tallenna snapshot. "
+    "Tallennus kirjoittaa tietokantaan rivin vain muuttuneille mittareille. "
+    "Kassan erittelyluvut voi esitäyttää kassaennusteesta."
 )
+
+# Edellisen tallennuksen tulos (sivu ajetaan tallennuksen jälkeen uudelleen)
+if "saved_count" in st.session_state:
+    st.success(f"Snapshot tallennettu tietokantaan (muuttuneita mittareita: {st.session_state.pop('saved_count')}).")
 st.divider()
 
+# --- Kassaennuste: esitäyttää Kassa-erittelyn mittarit ---
+forecast_seed = {}
+forecast_key = ""
+with st.expander("Kassaennuste"):
+    upload = st.file_uploader("Kuukausisaldot (CSV/Excel: kuukausi, saldo)", type=["csv", "xlsx"])
+    use_forecast = st.toggle("Esitäytä Kassa-erittely ennusteesta", value=upload is not None)
+
+    forecast = None
+    if use_forecast:
+        try:
+            if upload is not None:
+                forecast = cash_forecast(read_balances(upload.name, upload.getvalue()))
+            else:
+                _, forecast = load_cash_forecast(org)
+        except (ValueError, ImportError) as e:
+            st.error(f"Tiedostoa ei voitu lukea: {e}")
+
+        if forecast is None:
+            st.info("Kuukausisaldoja on liian vähän ennusteeseen.")
+        else:
+            st.caption(
+                f"{forecast['months']} kuukausisaldoa, {SCENARIOS} skenaariota {HORIZON_MONTHS} kk eteenpäin. "
+                "Varovainen / perus / optimistinen = 10. / 50. / 90. persentiili."
+            )
+            forecast_seed = detail_values(forecast)
+            st.dataframe(pd.Series(forecast_seed, name="Ennuste"), use_container_width=True)
+            # Uusi ennuste -> uudet kenttäavaimet, jolloin lomake esitäytetään uudelleen
+            forecast_key = hashlib.md5(repr(sorted(forecast_seed.items())).encode()).hexdigest()[:8]
+
+# --- Historian tuonti: vanha KPI-historia taulukosta ---
+with st.expander("Historian tuonti (CSV/Excel)"):
+    st.caption(
+        "Sarakkeet: date, metric, value, target, warning, direction (otsikkorivi vapaaehtoinen). "
+        "Jo tallennetut mittari+päivä-rivit ohitetaan, joten keskeytyneen tuonnin voi ajaa uudelleen."
+    )
+    history_file = st.file_uploader("Historiatiedosto", type=["csv", "xlsx"], key="history_file")
+    if history_file is not None:
+        content = history_file.getvalue()
+        try:
+            import_rows, rejected = validate(read_table(history_file.name, content), org)
+        except (ValueError, ImportError) as e:
+            st.error(f"Tiedostoa ei voitu lukea: {e}")
+        else:
+            import_rows, duplicates = dedupe(import_rows, load_snapshots(org))
+            st.write(
+                f"Tuotavia rivejä {len(import_rows)}, hylättyjä {len(rejected)}, "
+                f"jo tallennettuja tai tuplia {duplicates}."
+            )
+            if len(rejected):
+                st.dataframe(rejected.head(100), use_container_width=True)
+            if len(import_rows) and st.button(f"Tuo {len(import_rows)} riviä", key="import_history"):
+                progress = st.progress(0.0, text="Tuodaan…")
+                written = bulk_insert(
+                    to_records(import_rows, import_id(content, org)),
+                    on_progress=lambda done, total: progress.progress(done / total, text=f"{done}/{total}"),
+                    org=org,
+                )
+                st.success(f"Tuotu {written} riviä.")
+
 # --- Lomake: kaikki mittarit ---
 metrics = {}  # <-- tämä on se muuttuja, jonka puuttuminen aiheutti sinun virheen
 
 with st.form("kpi_form"):
-    for category, metric_list in ALL_METRICS.items():
+    for category, metric_list in categories.items():
         st.subheader(category)
 
         for metric_name in metric_list:
@@ -105,6 +167,11 @@ with st.form("kpi_form"):
             seed = latest_by_metric.get(metric_name) or DEFAULTS.get(metric_name) or {
                 "value": 0.0, "target": 0.0, "warning": 0.0, "direction": "up"
             }
+            # Avaimissa organisaatio, jottei vaihto tuo toisen organisaation syöttöjä
+            value_key = f"{org}/{metric_name}_value"
+            if metric_name in forecast_seed:
+                seed = {**seed, "value": forecast_seed[metric_name]}
+                value_key = f"{value_key}_{forecast_key}"
 
             c1, c2, c3, c4 = st.columns([2.2, 1, 1, 1.2])
 
@@ -112,26 +179,26 @@ with st.form("kpi_form"):
                 value = st.number_input(
                     f"{metric_name} – arvo",
                     value=float(seed["value"]),
-                    key=f"{metric_name}_value",
+                    key=value_key,
                 )
             with c2:
                 target = st.number_input(
                     "Tavoite",
                     value=float(seed["target"]),
-                    key=f"{metric_name}_target",
+                    key=f"{org}/{metric_name}_target",
                 )
             with c3:
                 warning = st.number_input(
                     "Varoitusraja",
                     value=float(seed["warning"]),
-                    key=f"{metric_name}_warning",
+                    key=f"{org}/{metric_name}_warning",
                 )
             with c4:
                 direction_ui = st.selectbox(
                     "Suunta",
                     ["up (suurempi parempi)", "down (pienempi parempi)"],
                     index=0 if seed["direction"] == "up" else 1,
-                    key=f"{metric_name}_direction",
+                    key=f"{org}/{metric_name}_direction",
                 )
                 direction = "up" if direction_ui.startswith("up") else "down"
 
@@ -139,43 +206,91 @@ with st.form("kpi_form"):
 
         st.divider()
 
-    submitted = st.form_submit_button("Tallenna snapshot tietokantaan")
-
-# --- Tallennus ---
-if submitted:
-    debug_name = "Tyttö-/naispelaajamäärä"
-    st.info(f"DEBUG: lomakkeen arvo '{debug_name}' = {metrics.get(debug_name)}")
-    now_iso = datetime.now().isoformat()
-    debug_name = "Tyttö-/naispelaajamäärä"
-    st.info(f"DEBUG: lomakkeen arvo '{debug_name}' = {metrics.get(debug_name)}")
-    rows = []
-    for name, (value, target, warning, direction) in metrics.items():
-        rows.append({
-            "date": now_iso,
-            "metric": name,
-            "value": float(value),
-            "target": float(target),
-            "warning": float(warning),
-            "direction": direction,
-        })
-
-    supabase.table("kpi_snapshots").insert(rows).execute()
-    st.success("Snapshot tallennettu Supabaseen (yksi rivi per mittari).")
+    st.form_submit_button("Esikatsele muutokset")
+
+# --- Tallennettavat muutokset: vain viimeisimmästä poikkeavat mittarit ---
+st.subheader("Tallennettavat muutokset")
+
+current = {
+    name: {"value": float(value), "target": float(target), "warning": float(warning), "direction": direction}
+    for name, (value, target, warning, direction) in metrics.items()
+}
+changed = changed_metrics(current, latest_by_metric)
+
+if not changed:
+    st.info("Ei muutoksia viimeisimpään tallennettuun snapshotiin.")
+else:
+    def _before(name, field):
+        prev = latest_by_metric.get(name)
+        return None if prev is None else prev[field]
+
+    st.dataframe(
+        pd.DataFrame([
+            {
+                "Mittari": name,
+                "Arvo (ennen)": _before(name, "value"),
+                "Arvo": current[name]["value"],
+                "Tavoite (ennen)": _before(name, "target"),
+                "Tavoite": current[name]["target"],
+                "Varoitus (ennen)": _before(name, "warning"),
+                "Varoitus": current[name]["warning"],
+                "Suunta": current[name]["direction"],
+            }
+            for name in changed
+        ]),
+        use_container_width=True,
+        hide_index=True,
+    )
+
+    # Sama avain ja aikaleima säilyvät, kunnes tallennus onnistuu: uudelleenlähetys
+    # tai tuplaklikkaus kirjoittaa samat rivit uudelleen eikä luo uusia (eikä siirrä
+    # palvelimen rivin päivää pois paikallisen kopion rivin kohdalta)
+    if "snapshot_key" not in st.session_state:
+        st.session_state["snapshot_key"] = str(uuid.uuid4())
+
+    # --- Tallennus ---
+    if st.button(f"Tallenna muutokset ({len(changed)}) tietokantaan", type="primary"):
+        now_iso = st.session_state.setdefault("snapshot_date", datetime.now().isoformat())
+        rows = [{"date": now_iso, "metric": name, **current[name]} for name in changed]
+
+        insert_snapshot(rows, snapshot_key=st.session_state["snapshot_key"], org=org)
+        del st.session_state["snapshot_key"], st.session_state["snapshot_date"]
+        st.session_state["saved_count"] = len(rows)
+        st.rerun()
 
 # --- Esikatselu: statuslista ---
 st.divider()
 st.subheader("Esikatselu (status nykyisillä syötöillä)")
 
-preview_rows = []
-for name, (value, target, warning, direction) in metrics.items():
-    status = get_status(float(value), float(target), float(warning), direction)
-    preview_rows.append({
-        "Status": status,
-        "Mittari": name,
-        "Arvo": value,
-        "Tavoite": target,
-        "Varoitus": warning,
-        "Suunta": direction,
-    })
-
-st.dataframe(pd.DataFrame(preview_rows), use_container_width=True)
+preview = pd.DataFrame(
+    [
+        {"metric": name, "value": value, "target": target, "warning": warning, "direction": direction}
+        for name, (value, target, warning, direction) in metrics.items()
+    ],
+    columns=["metric", "value", "target", "warning", "direction"],
+)
+preview.insert(0, "status", compute_status(preview, org))
+preview.columns = ["Status", "Mittari", "Arvo", "Tavoite", "Varoitus", "Suunta"]
+
+st.dataframe(preview, use_container_width=True)
+
+# --- Suorituskyky (vain ylläpitäjälle, sivu on jo PIN-suojattu) ---
+st.divider()
+with st.expander("Suorituskyky (debug)"):
+    st.caption(
+        "Vaiheiden ajat tämän palvelinprosessin viimeisimmistä latauksista (kaikki istunnot). "
+        "JSON-lokirivit saa päälle ympäristömuuttujalla KPI_TIMING_LOG=1."
+    )
+    stages = stage_stats()
+    if stages.empty:
+        st.write("Ei vielä mittauksia.")
+    else:
+        st.dataframe(stages, use_container_width=True, hide_index=True)
+
+    caches = cache_stats()
+    if not caches.empty:
+        st.dataframe(caches, use_container_width=True, hide_index=True)
+
+    if st.button("Nollaa mittaukset"):
+        reset_timings()
+        st.rerun()
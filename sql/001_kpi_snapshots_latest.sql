@@ -0,0 +1,13 @@
+-- Viimeisin rivi per mittari suoraan tietokannasta.
+-- Ylläpito ja Board View lukevat tätä näkymää, jolloin vastauksen koko pysyy
+-- vakiona (yksi rivi per mittari) historian kasvaessa.
+
+create index if not exists kpi_snapshots_metric_date_idx
+    on kpi_snapshots (metric, date desc);
+
+create or replace view kpi_snapshots_latest as
+select distinct on (metric) *
+from kpi_snapshots
+order by metric, date desc, id desc;
+
+grant select on kpi_snapshots_latest to anon, authenticated;
@@ -0,0 +1,26 @@
+-- Datan versio: yksi rivi, jonka versio kasvaa jokaisessa kpi_snapshots-kirjoituksessa.
+-- Sivut tarkistavat version pienellä pyynnöllä ja käyttävät välimuistissa olevaa
+-- dataa, kunnes versio muuttuu.
+
+create table if not exists kpi_data_version (
+    id int primary key default 1 check (id = 1),
+    version bigint not null default 0,
+    updated_at timestamptz not null default now()
+);
+
+insert into kpi_data_version (id) values (1) on conflict (id) do nothing;
+
+create or replace function bump_kpi_data_version() returns trigger
+language plpgsql security definer as $$
+begin
+    update kpi_data_version set version = version + 1, updated_at = now() where id = 1;
+    return null;
+end;
+$$;
+
+drop trigger if exists kpi_snapshots_bump_version on kpi_snapshots;
+create trigger kpi_snapshots_bump_version
+    after insert or update or delete or truncate on kpi_snapshots
+    for each statement execute function bump_kpi_data_version();
+
+grant select on kpi_data_version to anon, authenticated;
@@ -0,0 +1,11 @@
+-- Idempotentti tallennus: jokaisella Ylläpidon tallennuksella on oma avain, ja
+-- rivit kirjoitetaan upsertilla (snapshot_key, metric). Uudelleen lähetetty tai
+-- tuplaklikattu tallennus päivittää samat rivit eikä lisää uusia.
+
+alter table kpi_snapshots add column if not exists snapshot_key uuid;
+
+create unique index if not exists kpi_snapshots_snapshot_key_metric_idx
+    on kpi_snapshots (snapshot_key, metric);
+
+-- Upsert tarvitsee insertin lisäksi päivitysoikeuden
+grant update on kpi_snapshots to anon, authenticated;
@@ -0,0 +1,12 @@
+-- Board Viewn valmiiksi laskettu sisältö yhtenä rivinä. Ylläpidon tallennus ja
+-- päivittäinen workflow (python kpi_payload.py) kirjoittavat dokumentin; Board View
+-- lukee sen yhdellä pyynnöllä ja laskee itse vain, jos data_version ei täsmää.
+
+create table if not exists kpi_board_payload (
+    id int primary key default 1 check (id = 1),
+    data_version text not null,
+    payload jsonb not null,
+    built_at timestamptz not null default now()
+);
+
+grant select, insert, update on kpi_board_payload to anon, authenticated;
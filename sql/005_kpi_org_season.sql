@@ -0,0 +1,78 @@
+-- Useampi organisaatio ja kausi samassa tietokannassa. Jokainen rivi kuuluu
+-- organisaatioon (org_id) ja kauteen (season), ja kaikki haut rajataan
+-- organisaation osioon: indeksit alkavat org_id:llä, joten yhden organisaation
+-- haku ei kasva muiden datan mukana. Olemassa oleva data siirtyy
+-- oletusorganisaatiolle ('default', vrt. KPI_ORG).
+
+alter table kpi_snapshots add column if not exists org_id text not null default 'default';
+alter table kpi_snapshots add column if not exists season text;
+
+-- Aiemmin tallennettujen rivien kausi kalenterivuotena (vrt. KPI_SEASON_START)
+update kpi_snapshots set season = extract(year from date::timestamp)::int::text where season is null;
+
+create index if not exists kpi_snapshots_org_metric_date_idx
+    on kpi_snapshots (org_id, metric, date desc);
+create index if not exists kpi_snapshots_org_date_idx
+    on kpi_snapshots (org_id, date);
+create index if not exists kpi_snapshots_org_season_idx
+    on kpi_snapshots (org_id, season);
+-- Korvautuu org_id-alkuisella indeksillä
+drop index if exists kpi_snapshots_metric_date_idx;
+
+-- --- Datan versio organisaatiokohtaisesti ---
+-- Kirjoitus kasvattaa vain niiden organisaatioiden versiota, joiden rivejä
+-- se koski, joten muiden organisaatioiden välimuistit säilyvät.
+alter table kpi_data_version drop constraint if exists kpi_data_version_id_check;
+alter table kpi_data_version drop constraint if exists kpi_data_version_pkey;
+alter table kpi_data_version add column if not exists org_id text not null default 'default';
+alter table kpi_data_version alter column id drop not null;
+alter table kpi_data_version add primary key (org_id);
+
+create or replace function bump_kpi_data_version() returns trigger
+language plpgsql security definer as $$
+begin
+    if tg_op = 'TRUNCATE' then
+        update kpi_data_version set version = version + 1, updated_at = now();
+    else
+        insert into kpi_data_version as v (org_id, version)
+        select distinct org_id, 1 from changed_rows
+        on conflict (org_id) do update set version = v.version + 1, updated_at = now();
+    end if;
+    return null;
+end;
+$$;
+
+drop trigger if exists kpi_snapshots_bump_version on kpi_snapshots;
+drop trigger if exists kpi_snapshots_bump_version_insert on kpi_snapshots;
+drop trigger if exists kpi_snapshots_bump_version_update on kpi_snapshots;
+drop trigger if exists kpi_snapshots_bump_version_delete on kpi_snapshots;
+drop trigger if exists kpi_snapshots_bump_version_truncate on kpi_snapshots;
+create trigger kpi_snapshots_bump_version_insert
+    after insert on kpi_snapshots referencing new table as changed_rows
+    for each statement execute function bump_kpi_data_version();
+create trigger kpi_snapshots_bump_version_update
+    after update on kpi_snapshots referencing new table as changed_rows
+    for each statement execute function bump_kpi_data_version();
+create trigger kpi_snapshots_bump_version_delete
+    after delete on kpi_snapshots referencing old table as changed_rows
+    for each statement execute function bump_kpi_data_version();
+create trigger kpi_snapshots_bump_version_truncate
+    after truncate on kpi_snapshots
+    for each statement execute function bump_kpi_data_version();
+
+-- --- Viimeisin rivi per organisaatio ja mittari ---
+-- Sarakkeet muuttuvat, joten näkymä luodaan uudelleen
+drop view if exists kpi_snapshots_latest;
+create view kpi_snapshots_latest as
+select distinct on (org_id, metric) *
+from kpi_snapshots
+order by org_id, metric, date desc, id desc;
+
+grant select on kpi_snapshots_latest to anon, authenticated;
+
+-- --- Board-dokumentti per organisaatio ---
+alter table kpi_board_payload drop constraint if exists kpi_board_payload_id_check;
+alter table kpi_board_payload drop constraint if exists kpi_board_payload_pkey;
+alter table kpi_board_payload add column if not exists org_id text not null default 'default';
+alter table kpi_board_payload alter column id drop not null;
+alter table kpi_board_payload add primary key (org_id);